@@ -1,28 +1,15 @@
 import re
 from langchain.prompts import ChatPromptTemplate
 from langchain_huggingface import HuggingFaceEndpoint
-import requests
 import google.generativeai as genai
 from dotenv import load_dotenv
 import os
+from agents.qnaStore import fetch_answers
+from agents.chatSessions import sessions
 
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 
-BACKEND_URL = "http://127.0.0.1:5000/get-answer"
-def fetch_answer(object_id):
-    try:
-        response = requests.get(f"{BACKEND_URL}?objectId={object_id}")
-        if response.status_code == 200:
-            return response.json().get("answer", "")
-        else:
-            return ""
-    except Exception as e:
-        print(f"Error fetching answer for {object_id}: {e}")
-        return ""
-
-
-
 # llm = HuggingFaceEndpoint(
 #     repo_id="mistralai/Mixtral-8x7B-Instruct-v0.1",
 #     temperature=0.3,
@@ -30,7 +17,6 @@ def fetch_answer(object_id):
 # )
 genai.configure(api_key=api_key)
 llm = genai.GenerativeModel("gemini-2.0-flash")
-chat = llm.start_chat()
 
 
 rag_prompt_template = ChatPromptTemplate.from_messages([
@@ -59,19 +45,23 @@ def extract_final_answer(llm_response: str) -> str:
     return llm_response[last_a_index + 2:].strip()
 
 
-def AnswerQnaAgent(query: str, related_qa) -> str:
+def build_qna_prompt(query: str, related_qa):
+    """ Returns (prompt, contributing_links) for answering from the matched QnA pairs. """
     qa_pairs = []
     contributing_link = []
+    answers = fetch_answers([item["objectId"] for item in related_qa])  # one database query for all matches
     for item in related_qa:
-        answer = fetch_answer(item["objectId"]) # database backend call
-        if answer:
+        answer = answers.get(item["objectId"])
+        if isinstance(answer, dict):
             qa_pairs.append({
                 "question": item["question"],
                 "answer": answer['answer']
             })
-            for i in answer['contributing_links']:
+            for i in answer.get('contributing_links', []):
                 contributing_link.append(i)
             # print("Contributing Links:", answer['contributing_links'])
+        elif answer:
+            qa_pairs.append({"question": item["question"], "answer": answer})
 
     formatted_qa = "\n\n".join(
         f"Q: {pair['question']}\nA: {pair['answer']}" for pair in qa_pairs
@@ -83,8 +73,13 @@ def AnswerQnaAgent(query: str, related_qa) -> str:
     # response = llm.invoke(prompt).strip()
     formatted_messages = rag_prompt_template.format_messages(query=query,qa_pairs=formatted_qa)
     prompt_str = "\n\n".join([f"{msg.content}" for msg in formatted_messages])
+    return prompt_str, contributing_link
+
+
+def AnswerQnaAgent(query: str, related_qa, chat_id=None) -> str:
+    prompt_str, contributing_link = build_qna_prompt(query, related_qa)
     # response = llm.generate_content(prompt_str)
-    response = chat.send_message(prompt_str)
+    response = sessions.send_message(chat_id, prompt_str, question=query)
     llm_response = response.text.strip().lower()
     # final_answer = extract_final_answer(response)
     # return llm_response
@@ -1,23 +1,27 @@
 import os
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings, HuggingFaceEndpoint
+from langchain_huggingface import HuggingFaceEndpoint
 from langchain.prompts import PromptTemplate
 from langchain.prompts import ChatPromptTemplate
-from langchain.load import dumps, loads
 import google.generativeai as genai
 from dotenv import load_dotenv
 import os
 import json
 import re
+import numpy as np
+from agents.indexRegistry import get_index
+from agents.embeddingService import get_embedder, BGE_MODEL
+from agents.chatSessions import sessions
 
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 os.environ["HUGGINGFACEHUB_API_TOKEN"] = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 
-embedder = HuggingFaceEmbeddings(
-    model_name="BAAI/bge-base-en-v1.5",
-    model_kwargs={"device": "cpu"}
-)
+embedder = get_embedder(BGE_MODEL)
+
+VECTORSTORE_DIR = "/home/piyush/DCIM/code/projects/DL/DLHackathon/backend"
+
+def vectorstore_path(vectorstore_name: str) -> str:
+    return os.path.join(VECTORSTORE_DIR, vectorstore_name)
 
 # llm =  HuggingFaceEndpoint(
 #     repo_id="mistralai/Mixtral-8x7B-Instruct-v0.1", 
@@ -25,7 +29,6 @@ embedder = HuggingFaceEmbeddings(
 #     max_length=200)
 genai.configure(api_key=api_key)
 llm = genai.GenerativeModel("gemini-2.0-flash")
-chat = llm.start_chat()
 
 
 # RAG-Fusion: Related
@@ -69,15 +72,39 @@ def generate_search_queries(query: str):
         return f"❌ Error: {str(e)}"
     
 
+# Batched retrieval: one embedding call and one FAISS search for all fusion queries
+def batch_search_positions(vectorstore, queries: list[str], k: int = 6) -> np.ndarray:
+    """ Returns a (len(queries), k) array of index positions, -1 where fewer than k hits exist. """
+    vectors = np.asarray(embedder.embed_many(queries), dtype="float32")
+    if vectorstore._normalize_L2:
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    _, positions = vectorstore.index.search(vectors, k)
+    return positions
+
+
+def batch_similarity_search(vectorstore, queries: list[str], k: int = 6) -> list[list]:
+    """ Same result as calling vectorstore.similarity_search(q, k) for each query, in one batch. """
+    positions = batch_search_positions(vectorstore, queries, k)
+    return [materialize_docs(vectorstore, [pos for pos in row if pos != -1]) for row in positions]
+
+
+def materialize_docs(vectorstore, positions) -> list:
+    return [vectorstore.docstore.search(vectorstore.index_to_docstore_id[pos]) for pos in positions]
+
+
 # RRF Function
-def reciprocal_rank_fusion(results: list[list], k=60):
-    fused_scores = {}
-    for docs in results:
-        for rank, doc in enumerate(docs):
-            doc_str = dumps(doc)
-            fused_scores[doc_str] = fused_scores.get(doc_str, 0) + 1 / (rank + k)
-    reranked_results = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
-    return [loads(doc) for doc, _ in reranked_results]  # return docs only
+def reciprocal_rank_fusion(results: np.ndarray, k=60, top_n: int | None = None):
+    """
+    Fuses per-query rankings of index positions (rows of `results`, -1 = no hit).
+    Returns (positions, scores) ordered by fused score, truncated to top_n.
+    """
+    results = np.asarray(results)
+    ranks = np.broadcast_to(np.arange(results.shape[1]), results.shape)
+    valid = results != -1
+    positions, inverse = np.unique(results[valid], return_inverse=True)
+    scores = np.bincount(inverse, weights=1.0 / (ranks[valid] + k))
+    order = np.argsort(-scores, kind="stable")[:top_n]
+    return positions[order], scores[order]
 
 
 
@@ -99,7 +126,38 @@ prompt_template = ChatPromptTemplate.from_messages([
     )
 ])
 
-def AnswerRagAgent(query: str, vectorstore_name: str, k: int = 6):
+def retrieve_rag_docs(query: str, vectorstore_name: str, k: int = 6, rrf_top_n: int = 10) -> list:
+    """ RAG-Fusion retrieval: generate search queries, batch-search the store and fuse the rankings. """
+    generated_queries = generate_search_queries(query)
+    print(f"🔎 Generated Queries: {generated_queries}")
+    if not isinstance(generated_queries, list):
+        generated_queries = [query]
+
+    index_path = vectorstore_path(vectorstore_name)
+    vectorstore = get_index(index_path, embedder)
+    if vectorstore is None:
+        raise FileNotFoundError(f"Vector store not found at {index_path}")
+
+    all_results = batch_search_positions(vectorstore, generated_queries, k=k)
+    print(f"📚 Retrieved document sets for {len(generated_queries)} queries.")
+
+    fused_positions, _ = reciprocal_rank_fusion(all_results, k=60, top_n=rrf_top_n)
+    final_docs = materialize_docs(vectorstore, fused_positions)
+    print(f"✅ Final RRF documents: {len(final_docs)}")
+    return final_docs
+
+
+def build_rag_prompt(query: str, final_docs: list):
+    """ Returns (prompt, contributing_links) for answering from the retrieved documentation chunks. """
+    context = "\n\n".join([doc.page_content for doc in final_docs])
+    links = [doc.metadata.get("source", "No link available") for doc in final_docs]  # Extract links from metadata
+    formatted_messages = prompt_template.format_messages(context=context, question=query)
+    prompt_str = "\n\n".join([f"{msg.content}" for msg in formatted_messages])
+    return prompt_str, links
+
+
+def AnswerRagAgent(query: str, vectorstore_name: str, k: int = 6, rrf_top_n: int = 10, final_docs: list | None = None, chat_id=None):
+    """ Answers from the documentation store; pass final_docs to reuse documents retrieved earlier. """
     try:
         # index_path = f"/home/piyush/DCIM/code/projects/DL/DLHackathon/backend/{vectorstore_name}"
         # # index_path = vectorstore_name
@@ -120,27 +178,12 @@ def AnswerRagAgent(query: str, vectorstore_name: str, k: int = 6):
         # # return response.strip()
         # return llm_response
 
-        generated_queries = generate_search_queries(query)
-        print(f"🔎 Generated Queries: {generated_queries}")
-
-        index_path = f"/home/piyush/DCIM/code/projects/DL/DLHackathon/backend/{vectorstore_name}"
-        vectorstore = FAISS.load_local(index_path, embedder, allow_dangerous_deserialization=True)
-
-        all_results = []
-        for q in generated_queries:
-            docs = vectorstore.similarity_search(q, k=k)
-            all_results.append(docs)
-        print(f"📚 Retrieved document sets for {len(generated_queries)} queries.")
-
-        final_docs = reciprocal_rank_fusion(all_results, k=60)
-        print(f"✅ Final RRF documents: {len(final_docs)}")
+        if final_docs is None:
+            final_docs = retrieve_rag_docs(query, vectorstore_name, k=k, rrf_top_n=rrf_top_n)
 
-        context = "\n\n".join([doc.page_content for doc in final_docs])
-        links = [doc.metadata.get("source", "No link available") for doc in final_docs]  # Extract links from metadata
-        formatted_messages = prompt_template.format_messages(context=context, question=query)
-        prompt_str = "\n\n".join([f"{msg.content}" for msg in formatted_messages])
+        prompt_str, links = build_rag_prompt(query, final_docs)
         # response = llm.generate_content(prompt_str)
-        response = chat.send_message(prompt_str)
+        response = sessions.send_message(chat_id, prompt_str, question=query)
 
         # return response.text.strip()
         return {
@@ -1,6 +1,17 @@
 import os
+import re
+import threading
 from dotenv import load_dotenv
 import google.generativeai as genai
+from agents.prefixIndex import PrefixIndex
+
+# Autocomplete is served from an in-memory prefix index over past questions
+# (qna collection, chat messages) and documentation headings (the H2/H3/heading
+# metadata of the RAG vector store). Gemini is only asked when the index has
+# fewer than MIN_LOCAL_SUGGESTIONS completions for the typed prefix, and at
+# most LLM_FALLBACK_LIMIT of those calls run at once: when they are all busy
+# the local completions are returned as they are, so /suggest never queues
+# behind Gemini (it is kept out of the /ask admission limiter for that reason).
 
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
@@ -10,6 +21,15 @@ if not api_key:
 genai.configure(api_key=api_key)
 model = genai.GenerativeModel("gemini-2.0-flash")
 
+MIN_LOCAL_SUGGESTIONS = 3
+MAX_SUGGESTIONS = 5
+HEADING_KEYS = ("heading", "H2", "H3")
+LLM_FALLBACK_LIMIT = int(os.getenv("SUGGEST_LLM_LIMIT", "2"))
+
+_llm_slots = threading.BoundedSemaphore(LLM_FALLBACK_LIMIT)
+
+index = PrefixIndex()
+
 def get_matlab_suggestions(query: str) -> str:
     """
     Function to get MATLAB autocomplete suggestions based on a partial query.
@@ -29,10 +49,88 @@ def get_matlab_suggestions(query: str) -> str:
     response = model.generate_content(prompt)
     return response.text.strip()
 
+def parse_suggestions(text: str) -> list[str]:
+    """ The LLM answers "a $ b $ c", sometimes with bullet markers left in. """
+    suggestions = []
+    for part in text.split("$"):
+        part = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", part).strip()
+        if part:
+            suggestions.append(part)
+    return suggestions
+
+
+def suggest(query: str, k: int = MAX_SUGGESTIONS) -> list[str]:
+    """
+    Local completions first; topped up from Gemini when there are fewer than
+    MIN_LOCAL_SUGGESTIONS and an LLM slot is free.
+    """
+    suggestions = index.complete(query, k)
+    if len(suggestions) >= MIN_LOCAL_SUGGESTIONS:
+        return suggestions
+    if not _llm_slots.acquire(blocking=False):
+        return suggestions
+    try:
+        llm_suggestions = parse_suggestions(get_matlab_suggestions(query))
+    except Exception as e:
+        print(f"⚠️ Autocomplete LLM fallback failed: {e}")
+        return suggestions
+    finally:
+        _llm_slots.release()
+    seen = {PrefixIndex.normalize(s) for s in suggestions}
+    for suggestion in llm_suggestions:
+        if PrefixIndex.normalize(suggestion) not in seen:
+            seen.add(PrefixIndex.normalize(suggestion))
+            suggestions.append(suggestion)
+    return suggestions[:k]
+
+
+def add_question(question: str):
+    """ Called for every asked question so the index follows what users type. """
+    index.add(question)
+
+
+def build_index(corpus_path: str | None = None):
+    """ Fills the index from the qna and messages collections and the vector store's headings. """
+    from agents.qnaStore import get_db
+    db = get_db()
+    questions = 0
+    for collection in ("qna", "messages"):
+        for doc in db[collection].find({"question": {"$exists": True}}, {"_id": 0, "question": 1}):
+            if isinstance(doc["question"], str):
+                index.add(doc["question"])
+                questions += 1
+
+    headings = 0
+    if corpus_path:
+        from agents.indexRegistry import get_index
+        from agents.answerRagAgent import embedder
+        vectorstore = get_index(corpus_path, embedder)
+        if vectorstore is not None:
+            for doc in vectorstore.docstore._dict.values():
+                for key in HEADING_KEYS:
+                    heading = doc.metadata.get(key)
+                    if heading and heading != "Unknown":
+                        index.add(heading)
+                        headings += 1
+    print(f"✅ Autocomplete index built from {questions} questions and {headings} headings ({len(index)} phrases).")
+
+
+def start_index_build(corpus_path: str | None = None) -> threading.Thread:
+    """ Builds the index in the background; until it is ready suggestions fall back to Gemini. """
+    def run():
+        try:
+            build_index(corpus_path)
+        except Exception as e:
+            print(f"⚠️ Could not build autocomplete index: {e}")
+    thread = threading.Thread(target=run, name="autocomplete-index", daemon=True)
+    thread.start()
+    return thread
+
+
 if __name__ == "__main__":
     query = "how to pl"
     print("Query:")
     print(query)
-    suggestions = get_matlab_suggestions(query)
+    build_index()
     print("MATLAB Suggestions:")
-    print(suggestions)
+    print(suggest(query))
@@ -0,0 +1,99 @@
+import os
+import json
+import shutil
+import logging
+from langchain_community.vectorstores import FAISS
+
+# On-disk checkpoint of an index build, so an interrupted scrapingAgent run
+# resumes where it stopped instead of starting over.
+#
+#   crawl.json     crawler frontier / visited / failed, rewritten after every page
+#   pages.jsonl    every parsed page (url + parse result), appended as it is crawled
+#   index/         the FAISS store as of the last checkpoint
+#   progress.json  build options, the pages fully embedded into index/ with their
+#                  manifest entries, and embedding totals
+#
+# crawl.json is written before a page is appended to pages.jsonl, so on resume
+# a page is either logged (and replayed without fetching) or still counted as
+# in flight (and fetched again). progress.json is replaced only after index/
+# has been saved, so it never claims pages the saved store does not have.
+
+class BuildCheckpoint:
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write_json(self, name, data):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(name) + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(self._file(name) + ".tmp", self._file(name))
+
+    def _read_json(self, name):
+        try:
+            with open(self._file(name), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    # ---- crawl ----
+
+    def save_crawl(self, state: dict):
+        self._write_json("crawl.json", state)
+
+    def load_crawl(self):
+        return self._read_json("crawl.json")
+
+    def log_page(self, url, page):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("pages.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"url": url, "page": page}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def logged_pages(self):
+        """ Yields (url, page) for every logged page; a torn last line is ignored. """
+        try:
+            f = open(self._file("pages.jsonl"), encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                yield entry["url"], entry["page"]
+
+    # ---- embedding progress ----
+
+    def save_progress(self, progress: dict, sink=None):
+        """ Saves the sink's store (if any) to index/, then the progress that describes it. """
+        if sink is not None and sink.store is not None:
+            index_dir, tmp_dir, old_dir = self._file("index"), self._file("index.tmp"), self._file("index.old")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            sink.save(tmp_dir)
+            if os.path.exists(index_dir):
+                shutil.rmtree(old_dir, ignore_errors=True)
+                os.rename(index_dir, old_dir)
+            os.rename(tmp_dir, index_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        self._write_json("progress.json", progress)
+        logging.info(f"Checkpoint: {len(progress['completed'])} pages embedded.")
+
+    def load_progress(self):
+        return self._read_json("progress.json")
+
+    def load_store(self, embedder):
+        """ The checkpointed FAISS store (index.tmp is newer if a swap was interrupted), or None. """
+        for name in ("index", "index.tmp"):
+            try:
+                return FAISS.load_local(self._file(name), embedder, allow_dangerous_deserialization=True)
+            except Exception:
+                continue
+        return None
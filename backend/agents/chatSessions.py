@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+# Per-conversation Gemini sessions.
+#
+# Each chat_id keeps its last WINDOW_TURNS (question, answer) pairs plus a
+# rolling summary of everything older, so the history sent with a prompt
+# stays bounded however long the server runs. Turns pushed out of the window
+# are folded into the summary in batches, one Gemini call per WINDOW_TURNS
+# evicted turns rather than one per message. Only the user's question and
+# the answer are kept, not the retrieval context stuffed into the prompt.
+# Sessions idle for IDLE_TTL_S are dropped, and the least recently used
+# session is evicted past MAX_SESSIONS. Turns waiting to be summarised are
+# capped too, so a failing summariser cannot grow the history. Without a
+# chat_id, or for a new chat, the prompt goes through stateless generate_content.
+
+load_dotenv()
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+WINDOW_TURNS = int(os.getenv("CHAT_WINDOW_TURNS", "6"))
+MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+IDLE_TTL_S = float(os.getenv("CHAT_IDLE_TTL_S", "3600"))
+MAX_ANSWER_CHARS = 2000  # per remembered answer
+
+summary_prompt = """
+Update the running summary of a MATLAB troubleshooting conversation.
+Keep the user's setup, errors, what was tried and what was recommended. At most 150 words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:
+"""
+
+
+class ChatSessionManager:
+    def __init__(self, model_name="gemini-2.0-flash", window_turns=WINDOW_TURNS, max_sessions=MAX_SESSIONS, idle_ttl_s=IDLE_TTL_S):
+        self.model = genai.GenerativeModel(model_name)
+        self.window_turns = window_turns
+        self.max_sessions = max_sessions
+        self.idle_ttl_s = idle_ttl_s
+        self._sessions = OrderedDict()  # chat_id -> {"summary", "turns", "evicted", "since_fold", "last_used"}
+        self._lock = threading.Lock()
+        self._summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+
+    def _session(self, chat_id):
+        now = time.time()
+        with self._lock:
+            for stale_id in [cid for cid, s in self._sessions.items() if now - s["last_used"] > self.idle_ttl_s]:
+                del self._sessions[stale_id]
+            session = self._sessions.get(chat_id)
+            if session is None:
+                session = {"summary": "", "turns": deque(), "evicted": [], "since_fold": 0, "last_used": now}
+                self._sessions[chat_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            session["last_used"] = now
+            self._sessions.move_to_end(chat_id)
+            return session
+
+    def history(self, chat_id) -> list[dict]:
+        """ Gemini chat history for chat_id: the rolling summary followed by the recent window. """
+        if chat_id is None:
+            return []
+        session = self._session(chat_id)
+        with self._lock:
+            summary = session["summary"]
+            turns = list(session["evicted"]) + list(session["turns"])
+        history = []
+        if summary:
+            history.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{summary}"]})
+            history.append({"role": "model", "parts": ["Understood."]})
+        for question, answer in turns:
+            history.append({"role": "user", "parts": [question]})
+            history.append({"role": "model", "parts": [answer]})
+        return history
+
+    def send_message(self, chat_id, prompt: str, question: str | None = None, stream: bool = False):
+        """
+        Sends `prompt` with the conversation's context and remembers (question, answer).
+        For stream=True the caller iterates the response and then calls record_turn.
+        """
+        history = self.history(chat_id)
+        if history:
+            response = self.model.start_chat(history=history).send_message(prompt, stream=stream)
+        else:
+            response = self.model.generate_content(prompt, stream=stream)
+        if not stream and chat_id is not None:
+            self.record_turn(chat_id, question or prompt, response.text)
+        return response
+
+    def record_turn(self, chat_id, question: str, answer: str):
+        if chat_id is None:
+            return
+        session = self._session(chat_id)
+        with self._lock:
+            session["turns"].append((question, answer[:MAX_ANSWER_CHARS]))
+            overflow = []
+            while len(session["turns"]) > self.window_turns:
+                overflow.append(session["turns"].popleft())
+            session["evicted"].extend(overflow)
+            session["since_fold"] += len(overflow)
+            summarize = session["since_fold"] >= self.window_turns
+            if summarize:
+                session["since_fold"] = 0
+        if summarize:
+            self._summarizer.submit(self._fold_into_summary, session)
+
+    def _fold_into_summary(self, session):
+        """
+        Folds evicted turns into the rolling summary; they stay in the history until this
+        succeeds. If it fails, only the newest window_turns of them are kept for the next try.
+        """
+        with self._lock:
+            turns = list(session["evicted"])
+            summary = session["summary"]
+        if not turns:
+            return
+        turns_text = "\n\n".join(f"User: {q}\nAssistant: {a}" for q, a in turns)
+        try:
+            response = self.model.generate_content(summary_prompt.format(summary=summary or "(none)", turns=turns_text))
+            new_summary = response.text.strip()
+        except Exception as e:
+            print(f"⚠️ Could not update conversation summary: {e}")
+            with self._lock:
+                dropped = len(session["evicted"]) - self.window_turns
+                if dropped > 0:
+                    del session["evicted"][:dropped]
+                    print(f"⚠️ Dropped {dropped} unsummarised turn(s) to keep the history bounded.")
+            return
+        with self._lock:
+            session["summary"] = new_summary
+            del session["evicted"][:len(turns)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, "window_turns": self.window_turns}
+
+
+sessions = ChatSessionManager()
@@ -1,21 +1,16 @@
 import os
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings, HuggingFaceEndpoint
+from langchain_huggingface import HuggingFaceEndpoint
 from langchain.prompts.chat import ChatPromptTemplate
 from dotenv import load_dotenv
 import google.generativeai as genai
+from agents.relevanceClassifier import classify_relevance
 
 
 load_dotenv()
 os.environ["HUGGINGFACEHUB_API_TOKEN"] = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 api_key = os.getenv("GEMINI_API_KEY")
 
-embedder = HuggingFaceEmbeddings(
-    model_name="intfloat/e5-base-v2",
-    model_kwargs={"device": "cpu"}
-)
-
 # llm = HuggingFaceEndpoint(
 #     repo_id="mistralai/Mixtral-8x7B-Instruct-v0.1",
 #     temperature=0.7,
@@ -40,6 +35,16 @@ relevance_prompt_template = ChatPromptTemplate.from_messages([
 ])
 
 def isQueryRelevantAgent(query: str) -> str:
+    # Fast path: local kNN classifier; only fall back to the LLM when it is unsure (or broken).
+    try:
+        local_relevance = classify_relevance(query)
+    except Exception as e:
+        print(f"⚠️ Local relevance classifier failed, asking the LLM: {e}")
+        local_relevance = None
+    if local_relevance is not None:
+        print("Local classifier:", local_relevance)
+        return local_relevance
+
     try:
         # formatted_prompt = relevance_prompt_template.format_messages(query=query)
         # response = llm.invoke(formatted_prompt).strip().lower()
@@ -0,0 +1,182 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+# Concurrent documentation crawler used by scrapingAgent.
+#
+# Pages are fetched by a pool of worker threads sharing one pooled
+# requests.Session, with at most PER_HOST_LIMIT requests in flight per host.
+# Responses are kept in an on-disk cache together with their ETag /
+# Last-Modified; a re-crawl sends those back as conditional headers and a 304
+# reuses the cached body, so unchanged pages are not downloaded again.
+# Each page is handed to a parse callback in the worker thread, which returns
+# (result, links to enqueue); results are yielded as pages complete.
+
+CACHE_DIR = "Cache"
+WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))
+PER_HOST_LIMIT = int(os.getenv("CRAWL_PER_HOST", "4"))
+TIMEOUT_S = float(os.getenv("CRAWL_TIMEOUT_S", "20"))
+
+
+class ResponseCache:
+    """ url -> (body, validators), stored as <sha1>.html + <sha1>.json. """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+    def get(self, url):
+        """ (meta, body) for a cached url, or None. """
+        path = self._path(url)
+        try:
+            with open(path + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(path + ".html", encoding="utf-8") as f:
+                body = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        return meta, body
+
+    def put(self, url, body, etag=None, last_modified=None):
+        # Body first: a .json file only ever points at a complete .html file.
+        path = self._path(url)
+        for suffix, content in ((".html", body), (".json", json.dumps({"url": url, "etag": etag, "last_modified": last_modified}))):
+            with open(path + suffix + ".tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(path + suffix + ".tmp", path + suffix)
+
+
+class DocCrawler:
+    def __init__(self, parse, allowed_domain=None, max_pages=250, workers=WORKERS,
+                 per_host_limit=PER_HOST_LIMIT, cache_dir=CACHE_DIR):
+        """
+        parse(url, html) -> (result, links) runs in the worker threads. Links outside
+        allowed_domain (a hostname suffix) are dropped; cache_dir=None disables the cache.
+        """
+        self.parse = parse
+        self.allowed_domain = allowed_domain
+        self.max_pages = max_pages
+        self.workers = workers
+        self.per_host_limit = per_host_limit
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.visited = set()
+        self.failed = set()  # urls whose fetch failed
+        self.frontier = deque()
+        self.stats = {"downloaded": 0, "not_modified": 0, "failed": 0}
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            slots = self._host_slots.setdefault(host, threading.BoundedSemaphore(self.per_host_limit))
+        with slots:
+            yield
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def allowed(self, url) -> bool:
+        if not self.allowed_domain:
+            return True
+        host = urlparse(url).hostname or ""
+        return host == self.allowed_domain or host.endswith("." + self.allowed_domain)
+
+    def fetch(self, url):
+        """ Page body, from the cache when the server answers 304; None if the fetch fails. """
+        cached = self.cache.get(url) if self.cache else None
+        headers = {}
+        if cached:
+            if cached[0].get("etag"):
+                headers["If-None-Match"] = cached[0]["etag"]
+            if cached[0].get("last_modified"):
+                headers["If-Modified-Since"] = cached[0]["last_modified"]
+        try:
+            with self._host_slot(url):
+                resp = self.session.get(url, headers=headers, timeout=TIMEOUT_S)
+            if resp.status_code == 304 and cached:
+                self._count("not_modified")
+                return cached[1]
+            resp.raise_for_status()
+        except Exception as e:
+            logging.warning(f"Failed to fetch {url}: {e}")
+            self._count("failed")
+            with self._lock:
+                self.failed.add(url)
+            return None
+        self._count("downloaded")
+        if self.cache:
+            self.cache.put(url, resp.text, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        return resp.text
+
+    def _process(self, url):
+        html = self.fetch(url)
+        if html is None:
+            return None, []
+        try:
+            return self.parse(url, html)
+        except Exception as e:
+            logging.warning(f"Failed to parse {url}: {e}")
+            return None, []
+
+    def snapshot(self) -> dict:
+        """ Crawl state for a checkpoint; urls in flight are in visited and must be re-queued by restore. """
+        with self._lock:
+            failed = list(self.failed)
+        return {"frontier": list(self.frontier), "visited": list(self.visited), "failed": failed}
+
+    def restore(self, state, done=()):
+        """ Continues from snapshot(); visited urls that are neither in `done` nor failed are fetched again. """
+        self.failed = set(state["failed"])
+        finished = set(done) | self.failed
+        in_flight = [url for url in state["visited"] if url not in finished]
+        self.visited = set(state["visited"]) - set(in_flight)
+        self.frontier = deque(in_flight + state["frontier"])
+
+    def crawl(self, start_urls=()):
+        """
+        Breadth-first crawl from start_urls (plus anything restored into the frontier),
+        at most max_pages pages. Yields (url, result) in completion order; pages that
+        failed or parsed to None are skipped.
+        """
+        self.frontier.extend(start_urls)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawler") as pool:
+            pending = {}
+            while self.frontier or pending:
+                # Only `workers` pages are in flight, so the frontier is the only thing that grows.
+                while self.frontier and len(pending) < self.workers and len(self.visited) < self.max_pages:
+                    url = self.frontier.popleft()
+                    if url in self.visited or not self.allowed(url):
+                        continue
+                    logging.info(f"Visiting: {url}")
+                    self.visited.add(url)
+                    pending[pool.submit(self._process, url)] = url
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = pending.pop(future)
+                    result, links = future.result()
+                    self.frontier.extend(link for link in links if link not in self.visited)
+                    if result is not None:
+                        yield url, result
+        logging.info(f"Crawled {len(self.visited)} pages (limit {self.max_pages}): {self.stats}")
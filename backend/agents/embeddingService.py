@@ -0,0 +1,119 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+from agents.lruCache import LRUCache
+
+# One embedding model per process, shared by every agent.
+#
+# Each model gets a micro-batching worker thread: concurrent embed calls from
+# Flask threads are queued, and whatever arrives within BATCH_WAIT_MS is
+# encoded in a single forward pass. Results are memoized in an LRU cache keyed
+# by (model name, normalized text), so repeated questions skip the model.
+
+E5_MODEL = "intfloat/e5-base-v2"          # qnaDB questions
+BGE_MODEL = "BAAI/bge-base-en-v1.5"       # documentation chunks (faiss_vector_store)
+
+DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")  # Set to "cuda" if using GPU
+MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))  # 0 disables the cache
+
+_cache = LRUCache(CACHE_SIZE)
+
+
+def normalize_text(text: str) -> str:
+    # Both models use uncased tokenizers, so case and runs of whitespace
+    # do not change the embedding.
+    return " ".join(text.split()).lower()
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+
+class EmbeddingService(Embeddings):
+    """ LangChain-compatible embedder that coalesces concurrent requests into batches. """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": DEVICE})
+        self._requests = queue.Queue()
+        worker = threading.Thread(target=self._batch_loop, name=f"embed-{model_name}", daemon=True)
+        worker.start()
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        keys = [(self.model_name, normalize_text(text)) for text in texts]
+        vectors = [_cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self._embed([texts[i] for i in missing])):
+                vectors[i] = vector
+                _cache.put(keys[i], vector)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_many([text])[0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        # Bulk document embedding (index builds) bypasses the cache so it does
+        # not evict the query embeddings that are actually repeated.
+        return self._embed(texts)
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        future = Future()
+        self._requests.put((list(texts), future))
+        return future.result()
+
+    def _batch_loop(self):
+        wait_s = BATCH_WAIT_MS / 1000
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0][0])
+            while size < MAX_BATCH_SIZE:
+                try:
+                    item = self._requests.get(timeout=wait_s)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = self._model.embed_documents(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            start = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[start:start + len(item_texts)])
+                start += len(item_texts)
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_embedder(model_name: str = E5_MODEL) -> EmbeddingService:
+    """ Returns the process-wide service for `model_name`, loading the model on first use. """
+    with _services_lock:
+        if model_name not in _services:
+            print(f"🧠 Loading embedding model {model_name}...")
+            _services[model_name] = EmbeddingService(model_name)
+        return _services[model_name]
+
+
+def embed_query(text: str, model_name: str = E5_MODEL) -> list[float]:
+    return get_embedder(model_name).embed_query(text)
+
+
+def embed_many(texts: list[str], model_name: str = E5_MODEL) -> list[list[float]]:
+    return get_embedder(model_name).embed_many(texts)
@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import logging
+
+# Content-hash manifest for incremental rebuilds of faiss_vector_store.
+#
+# Stored next to the index as manifest.json:
+#   {"pages": {url: {"hash": <page hash>, "chunks": [chunk ids]}},
+#    "embed_s_per_chunk": <measured on the last build that embedded anything>}
+#
+# A chunk's id is the hash of its url, text and metadata, and doubles as its
+# FAISS docstore id. A rebuild only embeds chunk ids the manifest has not seen
+# and deletes the ids of chunks (or pages) that are gone; everything else stays
+# in the index untouched. Pages whose fetch failed keep their old chunks.
+
+MANIFEST_FILE = "manifest.json"
+
+
+def _hash(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class IndexManifest:
+    def __init__(self, index_dir, pages=None, embed_s_per_chunk=None):
+        self.index_dir = index_dir
+        self.old_pages = pages or {}
+        self.pages = {}  # rebuilt as pages come through diff_page
+        self.embed_s_per_chunk = embed_s_per_chunk
+        self.removed = {"pages": 0, "chunks": 0}
+
+    @classmethod
+    def load(cls, index_dir):
+        try:
+            with open(os.path.join(index_dir, MANIFEST_FILE), encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return cls(index_dir)
+        return cls(index_dir, data.get("pages"), data.get("embed_s_per_chunk"))
+
+    def __bool__(self):
+        return bool(self.old_pages)
+
+    @staticmethod
+    def chunk_id(url, doc) -> str:
+        return _hash(url, doc.page_content, json.dumps(doc.metadata, sort_keys=True))
+
+    def diff_page(self, url, docs) -> list:
+        """ Records the page's chunks and returns only those that still need embedding (ids set in metadata). """
+        ids = [self.chunk_id(url, doc) for doc in docs]
+        old = self.old_pages.get(url)
+        known = set(old["chunks"]) if old else set()
+
+        self.pages[url] = {"hash": _hash(*ids), "chunks": list(dict.fromkeys(ids))}
+        new_docs = []
+        seen = set()  # identical chunks on one page are stored once
+        for chunk_id, doc in zip(ids, docs):
+            if chunk_id in seen or chunk_id in known:
+                continue
+            seen.add(chunk_id)
+            doc.metadata["chunk_id"] = chunk_id
+            new_docs.append(doc)
+        return new_docs
+
+    def finish(self, keep_urls=()) -> list[str]:
+        """
+        Closes the diff once the crawl is done. Pages in keep_urls (failed fetches) that
+        were not re-crawled keep their old entries. Returns the chunk ids to delete.
+        """
+        for url in keep_urls:
+            if url in self.old_pages and url not in self.pages:
+                self.pages[url] = self.old_pages[url]
+        live = {chunk_id for page in self.pages.values() for chunk_id in page["chunks"]}
+        removed = []
+        for url, page in self.old_pages.items():
+            if url not in self.pages:
+                self.removed["pages"] += 1
+            removed.extend(chunk_id for chunk_id in page["chunks"] if chunk_id not in live)
+        removed = list(dict.fromkeys(removed))
+        self.removed["chunks"] = len(removed)
+        return removed
+
+    def record_embed_time(self, embed_s, chunks):
+        if chunks:
+            self.embed_s_per_chunk = embed_s / chunks
+
+    def report(self) -> dict:
+        """ Counts of the rebuild so far, derived from the old and new page entries. """
+        counts = {"pages_added": 0, "pages_changed": 0, "pages_unchanged": 0, "pages_removed": self.removed["pages"],
+                  "chunks_embedded": 0, "chunks_kept": 0, "chunks_removed": self.removed["chunks"]}
+        for url, page in self.pages.items():
+            old = self.old_pages.get(url)
+            if old is None:
+                counts["pages_added"] += 1
+            elif old["hash"] == page["hash"]:
+                counts["pages_unchanged"] += 1
+            else:
+                counts["pages_changed"] += 1
+            kept = len(set(page["chunks"]) & set(old["chunks"])) if old else 0
+            counts["chunks_kept"] += kept
+            counts["chunks_embedded"] += len(page["chunks"]) - kept
+        saved = counts["chunks_kept"] * (self.embed_s_per_chunk or 0.0)
+        return {**counts, "embed_s_saved": round(saved, 1)}
+
+    def save(self):
+        path = os.path.join(self.index_dir, MANIFEST_FILE)
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"pages": self.pages, "embed_s_per_chunk": self.embed_s_per_chunk}, f)
+        os.replace(path + ".tmp", path)
+        logging.info(f"Saved index manifest ({len(self.pages)} pages) to {path}")
@@ -0,0 +1,183 @@
+import os
+import time
+import queue
+import logging
+import threading
+from langchain_community.vectorstores import FAISS
+
+# Streaming index build used by scrapingAgent.
+#
+#   crawler workers (fetch + parse) -> pages -> split -> chunks -> embed + add
+#
+# Each arrow is a bounded queue, so a slow stage applies backpressure all the
+# way back to the crawler and only a few pages/batches are in memory at once.
+# Splitting runs on its own thread and embedding on the caller's, overlapping
+# with the crawler's network I/O. Embedded batches go straight into the FAISS
+# store. Every CHECKPOINT_EVERY batches (and when the build is interrupted) the
+# caller's checkpoint callback gets the pages whose chunks are all in the
+# store, so partial progress can be saved and resumed. For incremental
+# rebuilds the sink starts from the existing store and chunks carry their
+# manifest id (metadata "chunk_id"), which becomes their docstore id.
+
+PAGE_QUEUE_SIZE = int(os.getenv("PIPELINE_PAGE_QUEUE", "16"))
+CHUNK_QUEUE_SIZE = int(os.getenv("PIPELINE_CHUNK_QUEUE", "512"))
+EMBED_BATCH = int(os.getenv("PIPELINE_EMBED_BATCH", "64"))
+CHECKPOINT_EVERY = int(os.getenv("PIPELINE_CHECKPOINT_EVERY", "10"))  # batches
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+
+class FaissSink:
+    """ Accumulates embedded batches in one FAISS store (new, or `store` to update). """
+
+    def __init__(self, out_dir, embedder, store=None):
+        self.out_dir = out_dir
+        self.embedder = embedder
+        self.store = store
+        self._ids = set(store.index_to_docstore_id.values()) if store is not None else set()
+        self.chunks = 0
+
+    def contains(self, doc) -> bool:
+        """ True for chunks already stored under their chunk_id (e.g. embedded before a resume). """
+        return doc.metadata.get("chunk_id") in self._ids
+
+    def add(self, docs, vectors):
+        pairs = list(zip([doc.page_content for doc in docs], vectors))
+        metadatas = [doc.metadata for doc in docs]
+        ids = [doc.metadata["chunk_id"] for doc in docs] if all("chunk_id" in doc.metadata for doc in docs) else None
+        if self.store is None:
+            self.store = FAISS.from_embeddings(pairs, self.embedder, metadatas=metadatas, ids=ids)
+        else:
+            self.store.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+        self._ids.update(ids or ())
+        self.chunks += len(docs)
+
+    def delete(self, ids):
+        """ Drops chunks by docstore id (ids the store does not have are ignored). """
+        if self.store is None:
+            return
+        ids = [i for i in ids if i in self._ids]
+        if ids:
+            self.store.delete(ids)
+            self._ids.difference_update(ids)
+
+    def save(self, path=None):
+        if self.store is not None:
+            self.store.save_local(path or self.out_dir)
+
+    def close(self):
+        if self.store is None:
+            logging.warning("No chunks were embedded; the vector store was not written.")
+            return
+        self.save()
+        logging.info(f"Saved FAISS vector store ({self.chunks} new chunks) to {self.out_dir}")
+
+
+def _run_stage(target, out_queue):
+    """ Runs target() on a thread; errors are forwarded downstream instead of dying silently. """
+    def run():
+        try:
+            target()
+        except BaseException as e:
+            out_queue.put(_StageError(e))
+        else:
+            out_queue.put(_DONE)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _drain(in_queue):
+    while True:
+        item = in_queue.get()
+        if item is _DONE:
+            return
+        if isinstance(item, _StageError):
+            raise item.error
+        yield item
+
+
+def run_pipeline(pages, split, embedder, sink, embed_batch=EMBED_BATCH, checkpoint=None,
+                 checkpoint_every=CHECKPOINT_EVERY, page_queue_size=PAGE_QUEUE_SIZE, chunk_queue_size=CHUNK_QUEUE_SIZE):
+    """
+    pages: iterable of (url, page) as produced by DocCrawler.crawl
+    split(url, page) -> list[Document]
+    sink.add(docs, vectors) receives every embedded batch.
+    checkpoint(completed_urls, counts) is called every checkpoint_every batches and
+    before an error propagates, with every url whose chunks are all in the sink.
+    Returns {"pages", "chunks", "embed_s", "total_s"}.
+    """
+    started = time.perf_counter()
+    page_queue = queue.Queue(maxsize=page_queue_size)
+    chunk_queue = queue.Queue(maxsize=chunk_queue_size)
+    counts = {"pages": 0, "chunks": 0, "embed_s": 0.0}
+    outstanding = {}  # url -> chunks not yet in the sink
+    completed = []
+    lock = threading.Lock()
+
+    def feed_pages():
+        for item in pages:
+            page_queue.put(item)
+
+    def split_pages():
+        for url, page in _drain(page_queue):
+            counts["pages"] += 1
+            docs = split(url, page)
+            with lock:
+                if docs:
+                    outstanding[url] = len(docs)
+                else:
+                    completed.append(url)
+            for doc in docs:
+                chunk_queue.put((url, doc))
+
+    _run_stage(feed_pages, page_queue)
+    _run_stage(split_pages, chunk_queue)
+
+    def embed(batch):
+        docs = [doc for _, doc in batch if not sink.contains(doc)]
+        if docs:
+            t0 = time.perf_counter()
+            vectors = embedder.embed_documents([doc.page_content for doc in docs])
+            counts["embed_s"] += time.perf_counter() - t0
+            sink.add(docs, vectors)
+            counts["chunks"] += len(docs)
+        with lock:
+            for url, _ in batch:
+                outstanding[url] -= 1
+                if outstanding[url] == 0:
+                    del outstanding[url]
+                    completed.append(url)
+
+    def save_checkpoint():
+        if checkpoint:
+            with lock:
+                done = list(completed)
+            checkpoint(done, dict(counts))
+
+    batch = []
+    batches = 0
+    try:
+        for item in _drain(chunk_queue):
+            batch.append(item)
+            if len(batch) >= embed_batch:
+                embed(batch)
+                batch = []
+                batches += 1
+                if batches % checkpoint_every == 0:
+                    save_checkpoint()
+        if batch:
+            embed(batch)
+    except BaseException:
+        save_checkpoint()
+        raise
+
+    counts["total_s"] = time.perf_counter() - started
+    logging.info(f"Pipeline done: {counts['pages']} pages, {counts['chunks']} chunks, "
+                 f"{counts['embed_s']:.1f}s embedding of {counts['total_s']:.1f}s total.")
+    return counts
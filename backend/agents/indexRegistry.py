@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+from langchain_community.vectorstores import FAISS
+
+# Process-wide registry of FAISS stores (qnaDB, faiss_vector_store, ...).
+# Each store is loaded from disk once and shared by every request. When the
+# files on disk change (someone ran save_local), the next caller loads a new
+# snapshot and swaps it in; readers holding the old snapshot keep using it.
+# index.faiss and index.pkl are replaced one at a time, so a load that raced a
+# swap can pair the new vectors with the old docstore mapping. Such a load is
+# detected (the version changed while loading, or the vector count does not
+# match the mapping) and thrown away. Writers that swap the files call
+# invalidate() once both are in place.
+
+INDEX_FILES = ("index.faiss", "index.pkl")
+LOAD_ATTEMPTS = 3
+
+_snapshots = {}   # path -> (version, vectorstore)
+_load_locks = {}  # path -> lock, only held by the thread reloading that store
+_registry_lock = threading.Lock()
+
+
+def index_exists(path: str) -> bool:
+    return all(os.path.exists(os.path.join(path, name)) for name in INDEX_FILES)
+
+
+def index_version(path: str):
+    """
+    Version of the store on disk, built from the mtimes and sizes of its files.
+    Returns None if the store has not been written yet.
+    """
+    try:
+        stats = [os.stat(os.path.join(path, name)) for name in INDEX_FILES]
+    except FileNotFoundError:
+        return None
+    return tuple((st.st_mtime_ns, st.st_size) for st in stats)
+
+
+def _load_lock(path: str) -> threading.Lock:
+    with _registry_lock:
+        return _load_locks.setdefault(path, threading.Lock())
+
+
+def get_index(path: str, embedder):
+    """
+    Returns the current snapshot of the FAISS store at `path`, or None if it
+    does not exist. The returned store is shared: treat it as read-only and
+    never call add_documents/save_local on it.
+    """
+    path = os.path.abspath(path)
+    version = index_version(path)
+    if version is None:
+        return None
+
+    current = _snapshots.get(path)
+    if current is not None and current[0] == version:
+        return current[1]
+
+    lock = _load_lock(path)
+    if not lock.acquire(blocking=current is None):
+        # Another thread is already loading the new snapshot; keep serving the old one.
+        return current[1]
+    try:
+        current = _snapshots.get(path)
+        if current is not None and current[0] == version:
+            return current[1]
+        for attempt in range(LOAD_ATTEMPTS):
+            try:
+                vectorstore = _load_consistent(path, embedder, version)
+                break
+            except Exception as e:
+                # Files may be mid-write; fall back to the last good snapshot.
+                if current is not None:
+                    print(f"⚠️ Could not reload index at {path}, keeping previous snapshot: {e}")
+                    return current[1]
+                if attempt == LOAD_ATTEMPTS - 1:
+                    raise
+                time.sleep(0.1)
+                version = index_version(path)
+        _snapshots[path] = (version, vectorstore)
+        print(f"📦 Loaded index snapshot from {path}")
+        return vectorstore
+    finally:
+        lock.release()
+
+
+def _load_consistent(path: str, embedder, version):
+    """ Loads the store and checks that index.faiss and index.pkl belong to the same save. """
+    vectorstore = FAISS.load_local(path, embedder, allow_dangerous_deserialization=True)
+    if index_version(path) != version:
+        raise RuntimeError("index files changed while loading")
+    if vectorstore.index.ntotal != len(vectorstore.index_to_docstore_id):
+        raise RuntimeError(f"index.faiss has {vectorstore.index.ntotal} vectors but index.pkl maps "
+                           f"{len(vectorstore.index_to_docstore_id)}")
+    return vectorstore
+
+
+def invalidate(path: str):
+    """
+    Marks the cached snapshot stale so the next get_index() reloads from disk
+    (keeping it as the fallback). Called by writers after swapping in new index
+    files, in case the swap left mtimes and sizes unchanged.
+    """
+    path = os.path.abspath(path)
+    with _registry_lock:
+        current = _snapshots.get(path)
+        if current is not None:
+            _snapshots[path] = (None, current[1])
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import random
+import string
+import threading
+from bson import ObjectId
+from agents.qnaStore import insert_qnas
+from agents.qnaDbAgents import AddQuestionsQnaDb
+
+# Durable background queue for persisting RAG answers.
+#
+# The /ask request only appends (question, answer) to an on-disk spool file and
+# returns. A worker thread reads the spool from the last committed offset,
+# inserts each batch into Mongo with insert_many and into the qnaDB delta log,
+# and only then commits the new offset. Entries written before a crash or
+# restart are replayed; their Mongo _id is fixed at enqueue time so a replay
+# cannot create duplicates. A line that cannot be decoded (torn by a crash
+# mid-append) is moved to dead_letter.jsonl and skipped.
+
+QUEUE_DIR = "./indexing_queue"
+QUEUE_FILE = os.path.join(QUEUE_DIR, "queue.jsonl")
+OFFSET_FILE = os.path.join(QUEUE_DIR, "offset")
+DEAD_LETTER_FILE = os.path.join(QUEUE_DIR, "dead_letter.jsonl")
+BATCH_SIZE = int(os.getenv("INDEXING_BATCH_SIZE", "32"))
+RETRY_DELAY_S = 5
+ENTRY_KEYS = ("objectId", "ques_id", "question", "answer")
+
+_spool_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def generate_ques_id(length=24):
+    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
+
+
+def enqueue_qna(question: str, answer) -> str:
+    """ Durably queues a question/answer pair for Mongo + qnaDB indexing. Returns its ObjectId. """
+    object_id = str(ObjectId())
+    entry = {
+        "objectId": object_id,
+        "ques_id": generate_ques_id(),
+        "question": question,
+        "answer": answer
+    }
+    os.makedirs(QUEUE_DIR, exist_ok=True)
+    line = json.dumps(entry, default=str) + "\n"
+    with _spool_lock:
+        with open(QUEUE_FILE, "a+b") as f:
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = "\n" + line  # terminate a torn last line
+            f.write(line.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+    start_indexing_worker()
+    _wakeup.set()
+    return object_id
+
+
+def _read_offset() -> int:
+    try:
+        with open(OFFSET_FILE) as f:
+            offset = int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+    size = os.path.getsize(QUEUE_FILE) if os.path.exists(QUEUE_FILE) else 0
+    if offset > size:
+        # The spool was emptied but the reset offset never made it to disk.
+        print(f"⚠️ Indexing queue offset {offset} is past the end of the spool ({size} bytes), restarting from 0.")
+        return 0
+    return offset
+
+
+def _commit_offset(offset: int):
+    tmp = OFFSET_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(str(offset))
+    os.replace(tmp, OFFSET_FILE)
+
+
+def _read_batch(offset: int):
+    """ Returns (entries, new_offset) for up to BATCH_SIZE complete lines after offset. """
+    if not os.path.exists(QUEUE_FILE):
+        return [], offset
+    entries = []
+    with open(QUEUE_FILE, "rb") as f:
+        f.seek(offset)
+        while len(entries) < BATCH_SIZE:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break  # nothing left, or a line that is still being written
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                _dead_letter(line, e)
+                continue
+            if not isinstance(entry, dict) or any(key not in entry for key in ENTRY_KEYS):
+                _dead_letter(line, "missing fields")
+                continue
+            entries.append(entry)
+    return entries, offset
+
+
+def _dead_letter(line: bytes, error):
+    print(f"⚠️ Moving unreadable indexing queue entry to {DEAD_LETTER_FILE}: {error}")
+    with open(DEAD_LETTER_FILE, "ab") as f:
+        f.write(line)
+
+
+def _truncate_if_drained(offset: int) -> int:
+    """ Empties the spool once everything in it has been committed. """
+    with _spool_lock:
+        if os.path.exists(QUEUE_FILE) and os.path.getsize(QUEUE_FILE) == offset:
+            # Offset first: a crash in between only replays entries, which is safe.
+            _commit_offset(0)
+            open(QUEUE_FILE, "w").close()
+            return 0
+    return offset
+
+
+def _process(entries: list[dict]):
+    insert_qnas([
+        {
+            "_id": ObjectId(e["objectId"]),
+            "question": e["question"],
+            "answer": e["answer"],
+            "ques_id": e["ques_id"]
+        }
+        for e in entries
+    ])
+    AddQuestionsQnaDb([(e["question"], e["objectId"]) for e in entries])
+
+
+def _worker_loop():
+    offset = _read_offset()
+    while True:
+        entries, new_offset = _read_batch(offset)
+        if not entries:
+            if new_offset != offset:  # only dead-lettered lines
+                _commit_offset(new_offset)
+            offset = _truncate_if_drained(new_offset)
+            _wakeup.wait(timeout=1)
+            _wakeup.clear()
+            continue
+        try:
+            _process(entries)
+        except Exception as e:
+            print(f"❌ Indexing batch failed, retrying in {RETRY_DELAY_S}s: {e}")
+            time.sleep(RETRY_DELAY_S)
+            continue
+        _commit_offset(new_offset)
+        offset = new_offset
+        print(f"✅ Indexed {len(entries)} QnA pair(s) in the background.")
+
+
+def start_indexing_worker():
+    """ Starts the worker thread once per process; it first replays anything left in the spool. """
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            os.makedirs(QUEUE_DIR, exist_ok=True)
+            _worker = threading.Thread(target=_worker_loop, name="qna-indexing", daemon=True)
+            _worker.start()
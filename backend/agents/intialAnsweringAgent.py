@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 import google.generativeai as genai
+from agents.chatSessions import sessions
 
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
@@ -9,20 +10,23 @@ if not api_key:
 
 genai.configure(api_key=api_key)
 model = genai.GenerativeModel("gemini-2.0-flash")
-chat = model.start_chat()
 
 
-def InitialAnsweringAgent(query: str) -> str:
-    """
-    Function to answer initial query that is not related to MATLAB.
-    """
-    prompt = f"""
+def build_initial_prompt(query: str) -> str:
+    return f"""
     Query : {query}
     Prompt : Be friendly, keep your answer short and simple.
     """
 
+
+def InitialAnsweringAgent(query: str, chat_id=None) -> str:
+    """
+    Function to answer initial query that is not related to MATLAB.
+    """
+    prompt = build_initial_prompt(query)
+
     # response = model.generate_content(prompt)
-    response = chat.send_message(prompt)
+    response = sessions.send_message(chat_id, prompt, question=query)
     return {
         'answer': response.text.strip(),
         'contributing_links': []
@@ -0,0 +1,81 @@
+import threading
+
+# Weighted prefix index for autocomplete.
+#
+# A character trie over normalized phrases where every node keeps its TOP_K
+# heaviest completions, so a lookup is a walk down len(prefix) nodes plus a
+# copy of a short list. Weights only grow (add() bumps a phrase's count), which
+# keeps the per-node lists exact without ever rescanning a subtree. The trie is
+# cut off at MAX_DEPTH characters; the deepest node keeps every phrase below it
+# and longer prefixes are matched by scanning that (small) bucket.
+
+TOP_K = 10
+MAX_DEPTH = 32
+
+
+class _Node:
+    __slots__ = ("children", "top", "bucket")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []       # phrase keys, heaviest first
+        self.bucket = None  # all phrase keys below, only at MAX_DEPTH
+
+
+class PrefixIndex:
+    def __init__(self, top_k=TOP_K, max_depth=MAX_DEPTH):
+        self.top_k = top_k
+        self.max_depth = max_depth
+        self._root = _Node()
+        self._weights = {}  # key -> weight
+        self._display = {}  # key -> text as first seen
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    def __len__(self):
+        return len(self._weights)
+
+    def add(self, text: str, weight: int = 1):
+        key = self.normalize(text)
+        if not key or weight <= 0:
+            return
+        with self._lock:
+            self._display.setdefault(key, " ".join(text.split()))
+            self._weights[key] = self._weights.get(key, 0) + weight
+            node = self._root
+            self._offer(node, key)
+            for depth, char in enumerate(key[:self.max_depth], start=1):
+                node = node.children.setdefault(char, _Node())
+                self._offer(node, key)
+                if depth == self.max_depth:
+                    if node.bucket is None:
+                        node.bucket = set()
+                    node.bucket.add(key)
+
+    def _offer(self, node, key):
+        top = node.top
+        if key not in top:
+            if len(top) >= self.top_k and self._weights[top[-1]] >= self._weights[key]:
+                return
+            top.append(key)
+        top.sort(key=lambda k: -self._weights[k])
+        del top[self.top_k:]
+
+    def complete(self, prefix: str, k: int = 5) -> list[str]:
+        """ Up to k stored phrases extending prefix, heaviest first. """
+        prefix = self.normalize(prefix)
+        with self._lock:
+            node = self._root
+            for char in prefix[:self.max_depth]:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            if len(prefix) <= self.max_depth:
+                keys = node.top
+            else:
+                matches = [key for key in node.bucket or () if key.startswith(prefix)]
+                keys = sorted(matches, key=lambda key: -self._weights[key])
+            return [self._display[key] for key in keys if key != prefix][:k]
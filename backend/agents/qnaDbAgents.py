@@ -1,22 +1,20 @@
 import os
 from typing import List
-from langchain.vectorstores import FAISS
-from langchain.docstore.document import Document
-from langchain_huggingface import HuggingFaceEmbeddings, HuggingFaceEndpoint
+from langchain_huggingface import HuggingFaceEndpoint
 from langchain.prompts import ChatPromptTemplate
 import requests
 import pickle
 import google.generativeai as genai
 from dotenv import load_dotenv
+from agents.indexRegistry import get_index
+from agents.embeddingService import get_embedder, E5_MODEL
+from agents.qnaDeltaLog import append_entries, search_delta, compact, compact_in_background, COMPACT_THRESHOLD
 
 
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 
-embedder = HuggingFaceEmbeddings(
-    model_name="intfloat/e5-base-v2",
-    model_kwargs={"device": "cpu"}  # Set to "cuda" if using GPU
-)
+embedder = get_embedder(E5_MODEL)
 
 # llm = HuggingFaceEndpoint(
 #     repo_id="mistralai/Mixtral-8x7B-Instruct-v0.1",
@@ -49,13 +47,25 @@ VECTOR_DB_PATH = "./qnaDB"
 
 # qnaDB 
 def QuestionFinderAgent(query: str, k: int = 1):
-    if not os.path.exists(os.path.join(VECTOR_DB_PATH, "index.faiss")):
+    query_vector = embedder.embed_query(query)
+    # Search the append-only delta first, then the base snapshot, so a question
+    # that is being compacted shows up in at least one of them.
+    hits = search_delta(VECTOR_DB_PATH, query_vector, k)
+    db = get_index(VECTOR_DB_PATH, embedder)
+    if db is not None:
+        hits += db.similarity_search_with_score_by_vector(query_vector, k=k)
+    if not hits:
         print("❌ qnaDB does not exist yet.")
         return "no"
-    db = FAISS.load_local(VECTOR_DB_PATH, embedder, allow_dangerous_deserialization=True)
-    results = db.similarity_search(query, k=k)
-    if not results:
-        return "no"
+
+    results = []
+    seen_ids = set()
+    for doc, _ in sorted(hits, key=lambda hit: hit[1]):
+        if doc.metadata.get("objectId") in seen_ids:
+            continue
+        seen_ids.add(doc.metadata.get("objectId"))
+        results.append(doc)
+    results = results[:k]
     formatted_results = [
         {
             "question": doc.page_content,
@@ -85,19 +95,28 @@ def QuestionFinderAgent(query: str, k: int = 1):
 
 # qnaDB 
 def AddQuestionQnaDb(question: str, object_id: str):
-    doc = Document(
-        page_content=question,
-        metadata={"objectId": object_id}
-    )
-
-    if os.path.exists(os.path.join(VECTOR_DB_PATH, "index.faiss")):
-        db = FAISS.load_local(VECTOR_DB_PATH, embedder, allow_dangerous_deserialization=True)
-        db.add_documents([doc])
-    else:
-        db = FAISS.from_documents([doc], embedder)
+    AddQuestionsQnaDb([(question, object_id)])
+
+
+def AddQuestionsQnaDb(items: list[tuple[str, str]]):
+    """ Appends (question, objectId) pairs to the qnaDB delta log; the base index is rebuilt by compaction. """
+    if not items:
+        return
+    # embed_many goes through the query cache: these questions were usually just searched for.
+    vectors = embedder.embed_many([question for question, _ in items])
+    entries = [
+        {"question": question, "objectId": object_id, "vector": vector}
+        for (question, object_id), vector in zip(items, vectors)
+    ]
+    pending = append_entries(VECTOR_DB_PATH, entries)
+    print(f"✅ Added {len(entries)} question(s) to qnaDB.")
+    if pending >= COMPACT_THRESHOLD:
+        compact_in_background(VECTOR_DB_PATH, embedder)
+
 
-    db.save_local(VECTOR_DB_PATH)
-    print(f"✅ Added question to qnaDB with ObjectID: {object_id}")
+def compact_qnadb():
+    """ Folds all pending qnaDB delta entries into index.faiss/index.pkl. """
+    compact(VECTOR_DB_PATH, embedder)
 
 
 
@@ -123,6 +142,12 @@ def add_qna_to_backend(question: str, answer: str):
 
 
 if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["compact"]:
+        # python -m agents.qnaDbAgents compact
+        compact_qnadb()
+        sys.exit(0)
+
     # AddQuestionQnaDb("How to debug segmentation faults?", "68163cc7309002da1587611a")
     # AddQuestionQnaDb("What causes segmentation faults in MATLAB?", "68163cc3309002da15876119")
     # AddQuestionQnaDb("Can Simulink models cause segmentation faults?", "68163ca8309002da15876118")
@@ -0,0 +1,188 @@
+import os
+import json
+import threading
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain.docstore.document import Document
+from agents.indexRegistry import index_exists, invalidate, INDEX_FILES
+
+# Append-only delta segment for the qnaDB store.
+#
+# New questions are appended (question, objectId, vector) as JSON lines to
+# <store>/delta.jsonl, so an add costs the same no matter how big the base
+# index is. Readers tail the log and search it next to the base index.
+# compact() folds the delta into index.faiss/index.pkl: the log is first
+# rotated to delta.compacting.jsonl so appends never wait on the rebuild.
+# A compaction that crashed after the swap is finished on the next run;
+# entries whose objectId is already in the base index are not added again.
+# A line torn by a crash mid-append is skipped (and logged) by every reader,
+# and the next append starts on a fresh line so it is not glued onto it.
+
+DELTA_FILE = "delta.jsonl"
+COMPACTING_FILE = "delta.compacting.jsonl"
+ENTRY_KEYS = ("question", "objectId", "vector")
+COMPACT_THRESHOLD = int(os.getenv("QNADB_COMPACT_THRESHOLD", "500"))
+
+_write_lock = threading.Lock()
+_compact_lock = threading.Lock()
+_read_lock = threading.Lock()
+_segments = {}  # file path -> {"offset", "inode", "docs", "vectors"}
+
+
+def append_entries(path: str, entries: list[dict]):
+    """
+    Appends entries of the form {"question", "objectId", "vector"} to the delta log.
+    Returns the number of entries now waiting in the log.
+    """
+    os.makedirs(path, exist_ok=True)
+    lines = "".join(json.dumps(entry) + "\n" for entry in entries)
+    with _write_lock:
+        with open(os.path.join(path, DELTA_FILE), "a+b") as f:
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines = "\n" + lines  # terminate a torn last line
+            f.write(lines.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        return _pending_count(os.path.join(path, DELTA_FILE))
+
+
+def _pending_count(file_path: str) -> int:
+    return _read_segment(file_path)["vectors"].shape[0]
+
+
+def _decode(line, file_path: str):
+    """ One delta entry, or None (logged) for a torn or otherwise unreadable line. """
+    try:
+        entry = json.loads(line)
+    except ValueError as e:
+        print(f"⚠️ Skipping unreadable line in {file_path}: {e}")
+        return None
+    if not isinstance(entry, dict) or any(key not in entry for key in ENTRY_KEYS):
+        print(f"⚠️ Skipping incomplete entry in {file_path}: {line[:80]!r}")
+        return None
+    return entry
+
+
+def _read_segment(file_path: str) -> dict:
+    """ Tails a delta file from the last offset read, reloading it if it was rotated. """
+    with _read_lock:
+        seg = _segments.get(file_path)
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            _segments.pop(file_path, None)
+            return {"docs": [], "vectors": np.zeros((0, 0), dtype="float32")}
+
+        if seg is None or seg["inode"] != st.st_ino or st.st_size < seg["offset"]:
+            seg = {"offset": 0, "inode": st.st_ino, "docs": [], "vectors": np.zeros((0, 0), dtype="float32")}
+            _segments[file_path] = seg
+
+        if st.st_size > seg["offset"]:
+            with open(file_path, "rb") as f:
+                f.seek(seg["offset"])
+                data = f.read(st.st_size - seg["offset"])
+            # Only consume complete lines; a concurrent append may be half written.
+            end = data.rfind(b"\n") + 1
+            new_docs, new_vectors = [], []
+            for line in data[:end].splitlines():
+                if not line.strip():
+                    continue
+                entry = _decode(line, file_path)
+                if entry is None:
+                    continue
+                new_docs.append(Document(page_content=entry["question"], metadata={"objectId": entry["objectId"]}))
+                new_vectors.append(entry["vector"])
+            if new_vectors:
+                new_vectors = np.asarray(new_vectors, dtype="float32")
+                if seg["vectors"].size:
+                    seg["vectors"] = np.vstack([seg["vectors"], new_vectors])
+                else:
+                    seg["vectors"] = new_vectors
+                seg["docs"].extend(new_docs)
+            seg["offset"] += end
+        return seg
+
+
+def search_delta(path: str, vector, k: int) -> list:
+    """ Returns up to k (Document, squared L2 distance) pairs from the delta segments. """
+    query = np.asarray(vector, dtype="float32")
+    hits = []
+    for name in (COMPACTING_FILE, DELTA_FILE):
+        seg = _read_segment(os.path.join(path, name))
+        if not seg["docs"]:
+            continue
+        distances = np.sum((seg["vectors"] - query) ** 2, axis=1)
+        for i in np.argsort(distances)[:k]:
+            hits.append((seg["docs"][i], float(distances[i])))
+    hits.sort(key=lambda hit: hit[1])
+    return hits[:k]
+
+
+def _load_entries(file_path: str) -> list[dict]:
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, "rb") as f:
+        entries = [_decode(line, file_path) for line in f if line.strip()]
+    return [entry for entry in entries if entry is not None]
+
+
+def compact(path: str, embedder):
+    """
+    Folds the delta log into the base index. Safe to call while other threads
+    keep appending; only one compaction runs at a time.
+    """
+    if not _compact_lock.acquire(blocking=False):
+        return
+    try:
+        delta_path = os.path.join(path, DELTA_FILE)
+        compacting_path = os.path.join(path, COMPACTING_FILE)
+        with _write_lock:
+            # A leftover compacting file means a previous compaction crashed; fold it in now.
+            if not os.path.exists(compacting_path) and os.path.exists(delta_path):
+                os.replace(delta_path, compacting_path)
+
+        entries = _load_entries(compacting_path)
+        if not entries:
+            if os.path.exists(compacting_path):
+                os.remove(compacting_path)
+            return
+
+        db = FAISS.load_local(path, embedder, allow_dangerous_deserialization=True) if index_exists(path) else None
+        # Entries already in the base index were folded by a compaction that crashed
+        # before removing its segment (or were queued twice); add each objectId once.
+        folded = set()
+        if db is not None:
+            folded = {db.docstore.search(doc_id).metadata.get("objectId") for doc_id in db.index_to_docstore_id.values()}
+        new_entries = []
+        for e in entries:
+            if e["objectId"] not in folded:
+                folded.add(e["objectId"])
+                new_entries.append(e)
+
+        if new_entries:
+            text_embeddings = [(e["question"], e["vector"]) for e in new_entries]
+            metadatas = [{"objectId": e["objectId"]} for e in new_entries]
+            if db is not None:
+                db.add_embeddings(text_embeddings, metadatas=metadatas)
+            else:
+                db = FAISS.from_embeddings(text_embeddings, embedder, metadatas=metadatas)
+
+            tmp_dir = path.rstrip("/") + ".tmp"
+            db.save_local(tmp_dir)
+            # Readers may see one new and one old file in between; indexRegistry
+            # detects that pairing and keeps its previous snapshot.
+            for name in INDEX_FILES:
+                os.replace(os.path.join(tmp_dir, name), os.path.join(path, name))
+            os.rmdir(tmp_dir)
+            invalidate(path)
+        os.remove(compacting_path)
+        print(f"✅ Compacted {len(new_entries)} questions into qnaDB base index "
+              f"({len(entries) - len(new_entries)} already there).")
+    finally:
+        _compact_lock.release()
+
+
+def compact_in_background(path: str, embedder):
+    threading.Thread(target=compact, args=(path, embedder), daemon=True).start()
@@ -0,0 +1,65 @@
+import os
+import threading
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+
+# In-process data access for the "qna" collection, so agents running inside
+# the Flask process do not have to call back into it over HTTP.
+
+load_dotenv()
+MONGODB_URI = os.getenv("MONGODB_URI")
+DB_NAME = "troubleshooter"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> MongoClient:
+    """ Process-wide MongoClient (pymongo clients are thread-safe connection pools). """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(MONGODB_URI)
+        return _client
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def qna_collection():
+    return get_db()["qna"]
+
+
+def fetch_answers(object_ids: list[str]) -> dict:
+    """
+    Fetches the stored answers for all object ids with a single $in query.
+    Returns {objectId: answer}; unknown or malformed ids are left out.
+    """
+    ids = []
+    for object_id in object_ids:
+        try:
+            ids.append(ObjectId(object_id))
+        except (InvalidId, TypeError):
+            print(f"⚠️ Skipping invalid objectId: {object_id}")
+    if not ids:
+        return {}
+    cursor = qna_collection().find({"_id": {"$in": ids}}, {"answer": 1})
+    return {str(doc["_id"]): doc.get("answer") for doc in cursor}
+
+
+def insert_qnas(docs: list[dict]):
+    """
+    Inserts pre-built qna documents (with their own _id) in one round trip.
+    Documents that already exist are skipped, so replaying a batch is safe.
+    """
+    if not docs:
+        return
+    try:
+        qna_collection().insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
@@ -0,0 +1,140 @@
+import os
+import sys
+import threading
+import numpy as np
+from agents.embeddingService import get_embedder, E5_MODEL, normalize_text
+
+# Local kNN relevance classifier over e5 embeddings of labelled questions.
+#
+# isQueryRelevantAgent asks it first; it only answers when the nearest
+# labelled examples are close and agree, otherwise it returns None and the
+# Gemini classifier decides. The labelled set is rebuilt from the /ask logs
+# in Mongo with:
+#     python -m agents.relevanceClassifier refresh
+
+MODEL_PATH = "./relevanceClassifier/examples.npz"
+NEIGHBOURS = int(os.getenv("RELEVANCE_KNN_K", "7"))
+MIN_SIMILARITY = float(os.getenv("RELEVANCE_MIN_SIMILARITY", "0.88"))
+MIN_CONFIDENCE = float(os.getenv("RELEVANCE_MIN_CONFIDENCE", "0.9"))
+MAX_EXAMPLES = int(os.getenv("RELEVANCE_MAX_EXAMPLES", "20000"))
+
+# Used until the first refresh, so greetings never need the LLM.
+SEED_EXAMPLES = [
+    ("hi", "no"),
+    ("hello", "no"),
+    ("hey there", "no"),
+    ("good morning", "no"),
+    ("how are you?", "no"),
+    ("thank you", "no"),
+    ("thanks, that helped", "no"),
+    ("who are you?", "no"),
+    ("What is the capital of France?", "no"),
+    ("How do I fix segmentation faults in MATLAB?", "yes"),
+    ("How to resolve MATLAB system error?", "yes"),
+    ("What is ldd:FATAL: Could not load library xyz.so? How do I fix it?", "yes"),
+    ("MATLAB crashes when I run my Simulink model", "yes"),
+    ("Simulink Real-Time target computer not connecting", "yes"),
+    ("MATLAB license manager error", "yes"),
+]
+
+embedder = get_embedder(E5_MODEL)
+
+_model = None  # (mtime, vectors, labels)
+_model_lock = threading.Lock()
+
+
+def _unit(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype="float32")
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def _load_model():
+    global _model
+    try:
+        mtime = os.path.getmtime(MODEL_PATH)
+    except FileNotFoundError:
+        mtime = None
+    if _model is not None and _model[0] == mtime:
+        return _model
+    with _model_lock:
+        if _model is not None and _model[0] == mtime:
+            return _model
+        if mtime is None:
+            texts = [text for text, _ in SEED_EXAMPLES]
+            vectors = _unit(embedder.embed_documents(texts))
+            labels = np.array([label == "yes" for _, label in SEED_EXAMPLES])
+        else:
+            data = np.load(MODEL_PATH)
+            vectors, labels = data["vectors"], data["labels"].astype(bool)
+        _model = (mtime, vectors, labels)
+        return _model
+
+
+def classify_relevance(query: str):
+    """ Returns "yes"/"no" when the labelled neighbours are confident, else None. """
+    _, vectors, labels = _load_model()
+    if len(labels) == 0:
+        return None
+    sims = vectors @ _unit(embedder.embed_query(query))
+    top = np.argsort(-sims)[:NEIGHBOURS]
+    if sims[top[0]] < MIN_SIMILARITY:
+        return None
+    weights = np.clip(sims[top], 0, None)
+    yes_share = float(weights[labels[top]].sum() / weights.sum())
+    if yes_share >= MIN_CONFIDENCE:
+        return "yes"
+    if 1 - yes_share >= MIN_CONFIDENCE:
+        return "no"
+    return None
+
+
+RELEVANT_ROUTES = {"qna", "rag", "cache"}
+
+
+def label_from_message(msg):
+    """
+    Labels a logged /ask turn by the route that answered it: only "initial" means the
+    question was judged irrelevant. Turns logged before routes were stored fall back
+    to the answer: RAG answers cite documentation links, the initial answer never does
+    (a QnA answer from a stored string may not either, so this is only a fallback).
+    """
+    route = msg.get("route")
+    if route == "initial":
+        return "no"
+    if route in RELEVANT_ROUTES:
+        return "yes"
+    answer = msg.get("answer")
+    if not isinstance(answer, dict):
+        return None
+    return "yes" if answer.get("contributing_links") else "no"
+
+
+def load_labelled_questions() -> list[tuple[str, str]]:
+    from agents.qnaStore import get_db
+    examples = {}
+    cursor = get_db()["messages"].find({}, {"_id": 0, "question": 1, "answer": 1, "route": 1}).sort("timestamp", 1)
+    for msg in cursor:
+        label = label_from_message(msg)
+        if label and msg.get("question"):
+            examples[normalize_text(msg["question"])] = (msg["question"], label)
+    return list(examples.values())[-MAX_EXAMPLES:]
+
+
+def refresh():
+    """ Rebuilds the labelled example set from the /ask history and the seed examples. """
+    examples = SEED_EXAMPLES + load_labelled_questions()
+    vectors = _unit(embedder.embed_documents([text for text, _ in examples]))
+    labels = np.array([label == "yes" for _, label in examples])
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+    tmp_path = MODEL_PATH + ".tmp.npz"
+    np.savez(tmp_path, vectors=vectors, labels=labels)
+    os.replace(tmp_path, MODEL_PATH)
+    print(f"✅ Relevance classifier rebuilt from {len(examples)} examples ({int(labels.sum())} relevant).")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["refresh"]:
+        refresh()
+    else:
+        for query in sys.argv[1:] or ["hi", "How do I fix segmentation faults in MATLAB?"]:
+            print(f"{query!r}: {classify_relevance(query)}")
@@ -1,42 +1,53 @@
-import requests
-from bs4 import BeautifulSoup, Tag
+import os
+import argparse
+from itertools import chain
+from bs4 import BeautifulSoup, Tag, NavigableString, SoupStrainer
 from urllib.parse import urljoin, urlparse
 from langchain_text_splitters.markdown import MarkdownHeaderTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import FAISS
 import logging
 import re
+from langchain.schema import Document
+from docCrawler import DocCrawler
+from indexPipeline import FaissSink, run_pipeline
+from indexManifest import IndexManifest
+from buildCheckpoint import BuildCheckpoint
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+# Builds backend/faiss_vector_store from the MATLAB documentation. Run from the repo root:
+#     python backend/agents/scrapingAgent.py             # resume an interrupted build, else start one
+#     python backend/agents/scrapingAgent.py --restart   # discard the checkpoint and start over
+#     python backend/agents/scrapingAgent.py --full      # re-embed everything instead of only changed chunks
 
-BASE_URL = "https://in.mathworks.com"
-START_PATH = "/help/slrealtime/ug/troubleshooting-basics.html"
-MAX_PAGES = 250  # stop after visiting 150 unique pages
+# Point DOCS_BASE_URL / DOCS_DOMAIN at a local server to crawl fixture pages.
+BASE_URL = os.getenv("DOCS_BASE_URL", "https://in.mathworks.com")
+START_PATH = os.getenv("DOCS_START_PATH", "/help/slrealtime/ug/troubleshooting-basics.html")
+ALLOWED_DOMAIN = os.getenv("DOCS_DOMAIN", "mathworks.com")
+MAX_PAGES = int(os.getenv("DOCS_MAX_PAGES", "250"))  # stop after visiting 250 unique pages
+CACHE_DIR = os.getenv("CRAWL_CACHE_DIR", "backend/Cache")  # raw pages, revalidated with ETag/Last-Modified
+OUT_DIR = "backend/faiss_vector_store"
+CHECKPOINT_DIR = OUT_DIR + ".checkpoint"
+START_URL = urljoin(BASE_URL, START_PATH)
 
-visited = set()
-pages_to_visit = []
-all_texts = []  # tuples (url, markdown_content)
+# C-backed lxml when installed; only the content sections are parsed at all.
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+CONTENT_ONLY = SoupStrainer("section", attrs={"itemprop": "content"})
+RELATED_HEADER = re.compile(r"^(Related Topics|See Also)$", re.I)
 
-# Initialize open-source embedder and header-based splitter
-embedder = HuggingFaceEmbeddings(
-    model_name="BAAI/bge-base-en-v1.5",
-    model_kwargs={"device": "cpu"}
-)
+# Header-based splitter (the embedder is created by build_index)
 splitter = MarkdownHeaderTextSplitter(
     headers_to_split_on=[("##", "H2"), ("###", "H3")],
     strip_headers=False,
 )
 
 # Crawler functions
-def fetch_soup(url: str) -> BeautifulSoup:
-    try:
-        resp = requests.get(url)
-        resp.raise_for_status()
-        return BeautifulSoup(resp.text, "html.parser")
-    except Exception as e:
-        logging.warning(f"Failed to fetch {url}: {e}")
-        return None
+def in_domain(parsed) -> bool:
+    host = parsed.hostname or ""
+    return host == ALLOWED_DOMAIN or host.endswith("." + ALLOWED_DOMAIN)
 
 
 def extract_page_markdown(soup: BeautifulSoup) -> str:
@@ -79,9 +90,9 @@ def find_related_links(soup: BeautifulSoup, base_url: str) -> list[str]:
         for a in block.find_all('a', href=True):
             full = urljoin(base_url, a['href'])
             parsed = urlparse(full)
-            if parsed.netloc.endswith('mathworks.com'):
+            if in_domain(parsed):
                 clean = parsed.scheme + '://' + parsed.netloc + parsed.path
-                if clean not in visited and clean not in related:
+                if clean not in related:
                     related.append(clean)
     return related
 
@@ -93,64 +104,203 @@ def find_all_links(soup: BeautifulSoup, base_url: str) -> list[str]:
         for a in sec.find_all('a', href=True):
             full = urljoin(base_url, a['href'])
             parsed = urlparse(full)
-            if parsed.netloc.endswith('mathworks.com'):
+            if in_domain(parsed):
                 clean = parsed.scheme + '://' + parsed.netloc + parsed.path
                 if clean not in links:
                     links.append(clean)
     return links
 
-# Begin crawl
-start_url = urljoin(BASE_URL, START_PATH)
-pages_to_visit.append(start_url)
+def clean_link(base_url: str, href: str):
+    """ Absolute in-domain link without query/fragment, or None. """
+    parsed = urlparse(urljoin(base_url, href))
+    if in_domain(parsed):
+        return parsed.scheme + '://' + parsed.netloc + parsed.path
+    return None
 
-while pages_to_visit and len(visited) < MAX_PAGES:
-    url = pages_to_visit.pop(0)
-    if url in visited:
-        continue
-    logging.info(f"Visiting: {url}")
-    visited.add(url)
+def is_related_header(tag: Tag) -> bool:
+    return any(type(child) is NavigableString and RELATED_HEADER.search(child) for child in tag.children)
 
-    soup = fetch_soup(url)
-    if not soup:
-        continue
+def extract_page(html: str, base_url: str):
+    """
+    Fast path for extract_page_markdown + find_all_links + find_related_links: parses
+    only the content sections and walks them once, returning (markdown, all_links,
+    related_links). Related blocks are only found inside the content sections.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=CONTENT_ONLY)
+    md_lines = []
+    links = {}
+    related = {}
+
+    for sec in soup.find_all("section", {"itemprop": "content"}):
+        stack = [(sec, False)]  # (node, inside a Related Topics / See Also block)
+        while stack:
+            node, in_related = stack.pop()
+            name = node.name
+            if name in ("h2", "h3", "h4"):
+                md_lines.append(f"{'#'*int(name[1])} {node.get_text(' ', strip=True)}")
+            elif name == "p":
+                md_lines.append(node.get_text(' ', strip=True))
+            elif name == "li":
+                md_lines.append(f"- {node.get_text(' ', strip=True)}")
+            elif name == "pre":
+                md_lines.append("```\n" + node.get_text(strip=True) + "\n```")
+            elif name == "a" and node.has_attr("href"):
+                link = clean_link(base_url, node["href"])
+                if link:
+                    links[link] = None
+                    if in_related:
+                        related[link] = None
 
-    # Extract markdown
-    md = extract_page_markdown(soup)
+            # Children in document order; the first ul/div/section after a
+            # "See Also" header is a related block, as in find_related_links.
+            children = []
+            related_next = False
+            for child in node.children:
+                if not isinstance(child, Tag):
+                    continue
+                child_related = in_related
+                if related_next and child.name in ("ul", "div", "section"):
+                    child_related = True
+                    related_next = False
+                if is_related_header(child):
+                    related_next = True
+                children.append((child, child_related))
+            stack.extend(reversed(children))
+
+    return "\n\n".join(md_lines), list(links), list(related)
+
+def parse_page(url: str, html: str):
+    """ Runs in the crawler's workers: (markdown, page_links) for the page and the links to follow. """
+    md, all_links, related_links = extract_page(html, url)
     # Extract links: all anchors only for first page; otherwise empty
-    page_links = []
-    if url == start_url:
-        page_links = find_all_links(soup, start_url)
-        pages_to_visit.extend(page_links)
-    # Enqueue only related/see also links for recursion
-    for link in find_related_links(soup, url):
-        if link not in visited:
-            pages_to_visit.append(link)
-
-    all_texts.append((url, md, page_links))
-
-logging.info(f"Crawled {len(visited)} pages (limit {MAX_PAGES}).")
-with open("visited.txt", "w") as vf:
-    for link in visited:
-        vf.write(link + "\n")
-logging.info("Saved visited URLs to visited.txt")
-
-# Chunk, embed, and store metadata
-from langchain.schema import Document
-chunks = []
-for url, md, links in all_texts:
-    docs = splitter.split_text(md)
-    for doc in docs:
+    page_links = all_links if url == START_URL else []
+    # Follow those plus the related/see also links
+    return (md, page_links), page_links + related_links
+
+def split_page(url: str, page) -> list[Document]:
+    """ Header-split one page into chunks with their metadata. """
+    md, links = page
+    chunks = []
+    for doc in splitter.split_text(md):
         heading = doc.metadata.get('header', 'Unknown')
         metadata = {"source": url, "heading": heading}
         if links:
             metadata["links"] = links
         chunks.append(Document(page_content=doc.page_content, metadata=metadata))
+    return chunks
+
+def load_base_index(embedder, full: bool):
+    """ Manifest and store to update, or a fresh manifest and no store for a full build. """
+    if full:
+        return IndexManifest(OUT_DIR), None, True
+    manifest = IndexManifest.load(OUT_DIR)
+    if not manifest:
+        return manifest, None, True
+    try:
+        return manifest, FAISS.load_local(OUT_DIR, embedder, allow_dangerous_deserialization=True), False
+    except Exception as e:
+        logging.warning(f"Could not load {OUT_DIR} ({e}); rebuilding from scratch.")
+        return IndexManifest(OUT_DIR), None, True
+
+
+def build_index(restart: bool = False, full: bool = False, max_pages: int = MAX_PAGES):
+    embedder = HuggingFaceEmbeddings(
+        model_name="BAAI/bge-base-en-v1.5",
+        model_kwargs={"device": "cpu"}
+    )
+    checkpoint = BuildCheckpoint(CHECKPOINT_DIR)
+    progress = None if restart else checkpoint.load_progress()
+
+    if progress is None:
+        # Fresh build; incremental by default: only chunks missing from the manifest are embedded
+        checkpoint.clear()
+        manifest, store, full = load_base_index(embedder, full)
+        progress = {"full": full, "max_pages": max_pages, "completed": [], "pages": {}, "embed_s": 0.0, "chunks": 0}
+        checkpoint.save_progress(progress)
+    else:
+        logging.info(f"Resuming build from {CHECKPOINT_DIR} ({len(progress['completed'])} pages already embedded).")
+        full, max_pages = progress["full"], progress["max_pages"]
+        manifest = IndexManifest(OUT_DIR) if full else IndexManifest.load(OUT_DIR)
+        manifest.pages.update(progress["pages"])
+        store = checkpoint.load_store(embedder)
+        if store is None and not full:
+            _, store, _ = load_base_index(embedder, full)
+
+    completed_before = set(progress["completed"])
+    embed_s_before, chunks_before = progress["embed_s"], progress["chunks"]
+
+    def split_new_chunks(url: str, page) -> list[Document]:
+        return manifest.diff_page(url, split_page(url, page))
+
+    def save_checkpoint(completed_urls, counts):
+        completed = completed_before | set(completed_urls)
+        progress.update(
+            completed=list(completed),
+            pages={url: manifest.pages[url] for url in completed if url in manifest.pages},
+            embed_s=embed_s_before + counts["embed_s"],
+            chunks=chunks_before + counts["chunks"],
+        )
+        checkpoint.save_progress(progress, sink)
+
+    crawler = DocCrawler(parse_page, allowed_domain=ALLOWED_DOMAIN, max_pages=max_pages, cache_dir=CACHE_DIR)
+    crawl_state = checkpoint.load_crawl()
+    if crawl_state:
+        crawler.restore(crawl_state, done=(url for url, _ in checkpoint.logged_pages()))
+
+    def replayed_pages():
+        """ Pages parsed before the interruption whose chunks did not all make it into the checkpoint. """
+        for url, page in checkpoint.logged_pages():
+            if url not in completed_before:
+                yield url, page
+
+    def crawled_pages():
+        for url, page in crawler.crawl([] if crawl_state else [START_URL]):
+            checkpoint.save_crawl(crawler.snapshot())
+            checkpoint.log_page(url, page)
+            yield url, page
+        checkpoint.save_crawl(crawler.snapshot())
+
+    # Pages stream through splitting and batched embedding as they arrive
+    sink = FaissSink(OUT_DIR, embedder, store=store)
+    counts = run_pipeline(chain(replayed_pages(), crawled_pages()), split_new_chunks, embedder, sink,
+                          checkpoint=save_checkpoint)
+
+    sink.delete(manifest.finish(keep_urls=crawler.failed))
+    manifest.record_embed_time(embed_s_before + counts["embed_s"], chunks_before + counts["chunks"])
+    sink.close()
+    manifest.save()  # only after the index it describes is on disk
+
+    with open("visited.txt", "w") as vf:
+        for link in crawler.visited:
+            vf.write(link + "\n")
+    logging.info("Saved visited URLs to visited.txt")
+    checkpoint.clear()
+
+    report = manifest.report()
+    print("Pages:  added {pages_added}, changed {pages_changed}, unchanged {pages_unchanged}, removed {pages_removed}".format(**report))
+    print("Chunks: embedded {chunks_embedded}, kept {chunks_kept}, removed {chunks_removed}".format(**report))
+    print(f"Embedding time saved: ~{report['embed_s_saved']}s")
+    print("Done building vector store with correct metadata!")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl the MATLAB docs and build the RAG vector store.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--resume", action="store_true", help="continue an interrupted build (default when a checkpoint exists)")
+    mode.add_argument("--restart", action="store_true", help="discard any checkpoint and start a new build")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-embed every chunk (new builds only)")
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES, help="page limit for a new build")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+    if args.resume and BuildCheckpoint(CHECKPOINT_DIR).load_progress() is None:
+        parser.error(f"no checkpoint to resume in {CHECKPOINT_DIR}")
+    try:
+        build_index(restart=args.restart, full=args.full, max_pages=args.max_pages)
+    except KeyboardInterrupt:
+        print(f"Interrupted. Progress is checkpointed in {CHECKPOINT_DIR}; run again to resume.")
 
-logging.info(f"Prepared {len(chunks)} chunks with metadata.")
 
-# Build and persist FAISS store
-db = FAISS.from_documents(chunks, embedder)
-out_dir = "backend/faiss_vector_store"
-db.save_local(out_dir)
-logging.info(f"Saved FAISS vector store to {out_dir}")
-print("Done building vector store with correct metadata!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
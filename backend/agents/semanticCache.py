@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+from agents.embeddingService import get_embedder, E5_MODEL, normalize_text
+from agents.indexRegistry import index_version
+
+# Semantic answer cache in front of run_qna_workflow.
+#
+# A question whose e5 embedding has cosine similarity >= MIN_SIMILARITY with a
+# previously answered question gets the stored answer and links back with no
+# LLM calls. Entries expire after TTL_S, the least recently used entry is
+# evicted past MAX_ENTRIES, and everything is dropped when the documentation
+# store the answers were built from changes on disk.
+#
+# e5 similarities bunch up near the top of the range (unrelated questions
+# still score ~0.7-0.8, the same error asked about MATLAB vs Simulink far
+# higher), so a hit must be a near-verbatim rewording. 0.95 is a deliberately
+# conservative default: a false hit serves another question's answer, a miss
+# only costs one workflow run. Recalibrate it against labelled duplicate /
+# non-duplicate pairs with benchmarks/cacheCalibration.py, which reports the
+# lowest threshold with no false hits; set SEMANTIC_CACHE_MIN_SIMILARITY
+# comfortably above that.
+
+MIN_SIMILARITY = float(os.getenv("SEMANTIC_CACHE_MIN_SIMILARITY", "0.95"))
+TTL_S = float(os.getenv("SEMANTIC_CACHE_TTL_S", str(24 * 3600)))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_SIZE", "2000"))
+
+embedder = get_embedder(E5_MODEL)
+
+
+class SemanticCache:
+    def __init__(self, corpus_path: str, min_similarity=MIN_SIMILARITY, ttl_s=TTL_S, max_entries=MAX_ENTRIES):
+        self.corpus_path = corpus_path
+        self.min_similarity = min_similarity
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.recent_hits = deque(maxlen=100)  # (cached question, new question, similarity, age_s)
+        self._entries = OrderedDict()  # normalized question -> {"question", "vector", "answer", "created"}
+        self._matrix = None  # stacked vectors in _entries order, rebuilt lazily
+        self._keys = []
+        self._corpus_version = index_version(corpus_path)
+        self._lock = threading.Lock()
+
+    def _check_corpus(self):
+        version = index_version(self.corpus_path)
+        if version != self._corpus_version:
+            self._entries.clear()
+            self._matrix = None
+            self._corpus_version = version
+            self.invalidations += 1
+            print("♻️ Documentation store changed, semantic cache cleared.")
+
+    def _expire(self, now: float):
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl_s]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _unit_vector(self, question: str) -> np.ndarray:
+        vector = np.asarray(embedder.embed_query(question), dtype="float32")
+        return vector / np.linalg.norm(vector)
+
+    def lookup(self, question: str):
+        """ Returns the cached answer for a near-duplicate question, or None. """
+        vector = self._unit_vector(question)
+        now = time.time()
+        with self._lock:
+            self._check_corpus()
+            self._expire(now)
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[key]["vector"] for key in self._keys])
+            sims = self._matrix @ vector
+            best = int(np.argmax(sims))
+            if sims[best] < self.min_similarity:
+                self.misses += 1
+                return None
+            key = self._keys[best]
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.recent_hits.append((entry["question"], question, round(float(sims[best]), 4), round(now - entry["created"], 1)))
+            print(f"⚡ Semantic cache hit (similarity {sims[best]:.3f}): {entry['question']}")
+            return entry["answer"]
+
+    def store(self, question: str, answer):
+        vector = self._unit_vector(question)
+        with self._lock:
+            self._check_corpus()
+            self._entries[normalize_text(question)] = {
+                "question": question,
+                "vector": vector,
+                "answer": answer,
+                "created": time.time()
+            }
+            self._entries.move_to_end(normalize_text(question))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "recent_hits": [
+                    {"cached_question": q, "question": nq, "similarity": sim, "age_s": age}
+                    for q, nq, sim, age in self.recent_hits
+                ],
+            }
@@ -0,0 +1,131 @@
+"""
+Calibrates SEMANTIC_CACHE_MIN_SIMILARITY for the semantic answer cache.
+
+e5 cosine similarities are compressed into the top of the range (unrelated
+questions still score around 0.7-0.8), so the threshold has to be read off
+labelled pairs rather than guessed. For every pair this prints the cosine
+similarity the cache would compute, then the duplicates served (recall) and
+wrong answers served (false hits) at each threshold, and recommends the
+lowest threshold with no false hits.
+
+Labelled pairs come from the built-in set below (near-misses such as the
+MATLAB vs Simulink variant of the same error are the ones that matter) plus
+any --pairs files, one {"a": ..., "b": ..., "duplicate": true|false} per line.
+To label pairs from real traffic, dump each stored question in the qna
+collection with its nearest neighbour, fill in "duplicate", and pass the file
+back with --pairs.
+
+Run from the backend directory:
+    python -m benchmarks.cacheCalibration
+    python -m benchmarks.cacheCalibration --dump-qna qna_pairs.jsonl --sample 300
+    python -m benchmarks.cacheCalibration --pairs qna_pairs.jsonl
+"""
+import os
+import json
+import argparse
+import numpy as np
+
+# Measure the model, not cache hits.
+os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+
+from agents.semanticCache import embedder, MIN_SIMILARITY
+
+SEED_PAIRS = [
+    # Same question, reworded: should be served from the cache.
+    ("How do I fix 'Out of memory' errors in MATLAB?", "MATLAB says out of memory, how can I fix it?", True),
+    ("MATLAB crashes on startup on Windows 11", "MATLAB crashing at startup on Windows 11", True),
+    ("How to set LD_LIBRARY_PATH for MATLAB on Linux", "How do I set LD_LIBRARY_PATH for MATLAB in Linux?", True),
+    ("License manager error -8 when starting MATLAB", "Getting license manager error -8 on MATLAB start", True),
+    ("How can I reset MATLAB preferences to default?", "How do I restore the default MATLAB preferences?", True),
+    ("Invalid MEX-file error when calling my function", "Why do I get 'Invalid MEX-file' when calling my function?", True),
+    # Close but different: must not share an answer.
+    ("MATLAB crashes on startup on Windows 11", "Simulink crashes on startup on Windows 11", False),
+    ("Out of memory error in MATLAB", "Out of memory error in Simulink code generation", False),
+    ("License manager error -8 when starting MATLAB", "License manager error -9 when starting MATLAB", False),
+    ("How to install MATLAB on Linux", "How to uninstall MATLAB on Linux", False),
+    ("MATLAB crashes on startup on Windows 11", "MATLAB crashes on startup on macOS", False),
+    ("How do I fix 'Undefined function' for a toolbox function?", "How do I fix 'Undefined variable' in a script?", False),
+    ("Simulink model fails to compile with MinGW", "Simulink model fails to compile with Visual Studio", False),
+    ("How to set LD_LIBRARY_PATH for MATLAB on Linux", "How to set PATH for MATLAB on Windows", False),
+]
+
+THRESHOLDS = [round(0.85 + 0.01 * i, 2) for i in range(15)]  # 0.85 .. 0.99
+
+
+def unit_vectors(texts):
+    vectors = np.asarray(embedder.embed_many(texts), dtype="float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load_pairs(paths):
+    pairs = list(SEED_PAIRS)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                pair = json.loads(line)
+                if pair.get("duplicate") is None:
+                    continue  # not labelled yet
+                pairs.append((pair["a"], pair["b"], bool(pair["duplicate"])))
+    return pairs
+
+
+def pair_similarities(pairs):
+    a = unit_vectors([p[0] for p in pairs])
+    b = unit_vectors([p[1] for p in pairs])
+    return np.sum(a * b, axis=1)
+
+
+def dump_qna_pairs(out_path, sample):
+    """ Writes each sampled qna question with its nearest other question, unlabelled. """
+    from agents.qnaStore import qna_collection
+    questions = [doc["question"] for doc in qna_collection().aggregate([
+        {"$match": {"question": {"$type": "string"}}},
+        {"$sample": {"size": sample}},
+        {"$project": {"question": 1}},
+    ])]
+    questions = list(dict.fromkeys(questions))
+    if len(questions) < 2:
+        raise SystemExit("❌ Not enough questions in the qna collection.")
+    vectors = unit_vectors(questions)
+    sims = vectors @ vectors.T
+    np.fill_diagonal(sims, -1.0)
+    with open(out_path, "w", encoding="utf-8") as f:
+        for i, j in enumerate(np.argmax(sims, axis=1)):
+            f.write(json.dumps({"a": questions[i], "b": questions[j], "similarity": round(float(sims[i, j]), 4),
+                                "duplicate": None}) + "\n")
+    print(f"✅ Wrote {len(questions)} nearest-neighbour pairs to {out_path}; set \"duplicate\" and pass it to --pairs.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", action="append", default=[], help="labelled pairs (jsonl), may be repeated")
+    parser.add_argument("--dump-qna", help="write nearest-neighbour pairs from the qna collection for labelling")
+    parser.add_argument("--sample", type=int, default=300)
+    args = parser.parse_args()
+
+    if args.dump_qna:
+        dump_qna_pairs(args.dump_qna, args.sample)
+        raise SystemExit()
+
+    pairs = load_pairs(args.pairs)
+    sims = pair_similarities(pairs)
+    labels = np.array([dup for _, _, dup in pairs])
+
+    for (a, b, dup), sim in sorted(zip(pairs, sims), key=lambda item: -item[1]):
+        print(f"{sim:.4f}  {'dup ' if dup else 'diff'}  {a!r} / {b!r}")
+
+    print(f"\n{'threshold':>9}  {'recall':>6}  false hits")
+    for t in THRESHOLDS:
+        served = sims >= t
+        recall = served[labels].mean() if labels.any() else 0.0
+        print(f"{t:>9.2f}  {recall:>6.2f}  {int(served[~labels].sum())}")
+
+    hardest = float(sims[~labels].max()) if (~labels).any() else 0.0
+    safe = [t for t in THRESHOLDS if t > hardest]
+    print(f"\n{labels.sum()} duplicate / {(~labels).sum()} different pairs; "
+          f"most similar different pair: {hardest:.4f}")
+    print(f"current MIN_SIMILARITY: {MIN_SIMILARITY}")
+    if safe:
+        print(f"lowest threshold with no false hits: {safe[0]}")
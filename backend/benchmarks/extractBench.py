@@ -0,0 +1,79 @@
+"""
+Compares the original scrapingAgent extraction (full html.parser tree, then
+extract_page_markdown, find_all_links and find_related_links) with the
+single-pass extract_page over saved pages.
+
+The fixture pages are the crawler's response cache (<sha1>.html + <sha1>.json).
+Run from the backend directory:
+    python -m benchmarks.extractBench --pages Cache --rounds 3
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from bs4 import BeautifulSoup
+
+# scrapingAgent imports its sibling modules by bare name.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents"))
+import scrapingAgent
+
+
+def load_pages(cache_dir):
+    pages = []
+    for meta_path in sorted(glob.glob(os.path.join(cache_dir, "*.json"))):
+        html_path = meta_path[:-len(".json")] + ".html"
+        if not os.path.exists(html_path):
+            continue
+        with open(meta_path, encoding="utf-8") as f:
+            url = json.load(f)["url"]
+        with open(html_path, encoding="utf-8") as f:
+            pages.append((url, f.read()))
+    return pages
+
+
+def legacy_extract(html, url):
+    soup = BeautifulSoup(html, "html.parser")
+    return (scrapingAgent.extract_page_markdown(soup),
+            scrapingAgent.find_all_links(soup, url),
+            scrapingAgent.find_related_links(soup, url))
+
+
+def fast_extract(html, url):
+    return scrapingAgent.extract_page(html, url)
+
+
+def pages_per_second(fn, pages, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for url, html in pages:
+            fn(html, url)
+    return rounds * len(pages) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", default="Cache", help="crawler cache directory with the fixture pages")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not pages:
+        raise SystemExit(f"❌ No cached pages in {args.pages}; run scrapingAgent first.")
+
+    # Same links from both paths; the markdown can only differ where lxml repairs malformed HTML differently.
+    same_md = same_links = 0
+    for url, html in pages:
+        md, links, related = legacy_extract(html, url)
+        fast_md, fast_links, fast_related = fast_extract(html, url)
+        same_md += md == fast_md
+        same_links += links == fast_links and related == fast_related
+
+    legacy_pps = pages_per_second(legacy_extract, pages, args.rounds)
+    fast_pps = pages_per_second(fast_extract, pages, args.rounds)
+    print(f"pages         : {len(pages)} (parser: {scrapingAgent.HTML_PARSER})")
+    print(f"same markdown : {same_md}/{len(pages)}, same links: {same_links}/{len(pages)}")
+    print(f"original      : {legacy_pps:.1f} pages/s")
+    print(f"single pass   : {fast_pps:.1f} pages/s")
+    print(f"speedup       : {fast_pps / legacy_pps:.2f}x")
@@ -0,0 +1,67 @@
+"""
+Compares the per-query similarity_search loop with batch_similarity_search
+for the RAG-Fusion retrieval step.
+
+Run from the backend directory:
+    python -m benchmarks.ragSearchBench --rounds 20
+"""
+import os
+import time
+import argparse
+
+# Measure real embedding work, not cache hits.
+os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+
+from agents.answerRagAgent import embedder, batch_similarity_search
+from agents.indexRegistry import get_index
+
+QUERY_SETS = [
+    [
+        "how to fix segmentation fault in MATLAB",
+        "MATLAB crash caused by MEX function",
+        "debug MATLAB segmentation violation",
+        "MATLAB crash dump analysis",
+    ],
+    [
+        "ldd FATAL could not load library",
+        "MATLAB missing shared library on Linux",
+        "set LD_LIBRARY_PATH for MATLAB",
+        "resolve shared object load error in Simulink Real-Time",
+    ],
+]
+
+
+def loop_search(vectorstore, queries, k):
+    return [vectorstore.similarity_search(q, k=k) for q in queries]
+
+
+def time_it(fn, vectorstore, rounds, k):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for queries in QUERY_SETS:
+            fn(vectorstore, queries, k)
+    return (time.perf_counter() - start) / (rounds * len(QUERY_SETS))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", default="faiss_vector_store")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("-k", type=int, default=6)
+    args = parser.parse_args()
+
+    vectorstore = get_index(args.index, embedder)
+    if vectorstore is None:
+        raise SystemExit(f"❌ No FAISS index at {args.index}")
+
+    # Warm up the model and check both paths agree.
+    for queries in QUERY_SETS:
+        expected = [[d.page_content for d in docs] for docs in loop_search(vectorstore, queries, args.k)]
+        actual = [[d.page_content for d in docs] for docs in batch_similarity_search(vectorstore, queries, args.k)]
+        assert expected == actual, "batched search returned different documents"
+
+    loop_s = time_it(loop_search, vectorstore, args.rounds, args.k)
+    batch_s = time_it(batch_similarity_search, vectorstore, args.rounds, args.k)
+    print(f"loop   : {loop_s * 1000:.1f} ms per fusion query set")
+    print(f"batched: {batch_s * 1000:.1f} ms per fusion query set")
+    print(f"speedup: {loop_s / batch_s:.2f}x")
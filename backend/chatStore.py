@@ -0,0 +1,269 @@
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+from agents.qnaStore import get_db
+
+# Normalized chat storage.
+#
+#   chats:    one lightweight header per conversation
+#             {user_id, chat_id, chat_name, created_at, updated_at}
+#   messages: one document per question/answer turn
+#             {user_id, chat_id, ques_id, question, answer, mode, timestamp}
+#
+# Appending a turn is a single insert instead of rewriting the user's whole
+# chat_history array. Legacy user documents are moved over by
+# migrateChatHistory.py.
+
+db = get_db()
+chats_collection = db["chats"]
+messages_collection = db["messages"]
+
+DEFAULT_CHAT_NAME = "Welcome Chat"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def ensure_indexes():
+    messages_collection.create_index([("user_id", ASCENDING), ("chat_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)])
+    messages_collection.create_index("ques_id", unique=True, sparse=True)
+    chats_collection.create_index([("user_id", ASCENDING), ("chat_id", ASCENDING)], unique=True)
+    chats_collection.create_index([("user_id", ASCENDING), ("created_at", ASCENDING)])
+
+
+def create_chat(user_id, chat_id, chat_name=DEFAULT_CHAT_NAME, created_at=None):
+    """ Creates the chat header if it does not exist yet. Returns True if it was created. """
+    created_at = created_at or datetime.utcnow()
+    result = chats_collection.update_one(
+        {"user_id": user_id, "chat_id": chat_id},
+        {"$setOnInsert": {"chat_name": chat_name, "created_at": created_at, "updated_at": created_at}},
+        upsert=True
+    )
+    return result.upserted_id is not None
+
+
+def append_message(user_id, chat_id, message: dict) -> bool:
+    """
+    Stores one turn and bumps the chat header (creating it on first use).
+    Returns True if the chat was created by this message.
+    """
+    messages_collection.insert_one({"user_id": user_id, "chat_id": chat_id, **message})
+    result = chats_collection.update_one(
+        {"user_id": user_id, "chat_id": chat_id},
+        {
+            "$setOnInsert": {"chat_name": DEFAULT_CHAT_NAME, "created_at": message["timestamp"]},
+            "$set": {"updated_at": message["timestamp"]}
+        },
+        upsert=True
+    )
+    return result.upserted_id is not None
+
+
+def delete_chat(user_id, chat_id):
+    chats_collection.delete_one({"user_id": user_id, "chat_id": chat_id})
+    messages_collection.delete_many({"user_id": user_id, "chat_id": chat_id})
+
+
+def list_chats(user_id) -> list[dict]:
+    return list(chats_collection.find(
+        {"user_id": user_id},
+        {"_id": 0, "chat_id": 1, "chat_name": 1}
+    ).sort("created_at", ASCENDING))
+
+
+def get_chat(user_id, chat_id):
+    return chats_collection.find_one({"user_id": user_id, "chat_id": chat_id}, {"_id": 0})
+
+
+def encode_cursor(msg) -> str:
+    """ Page cursor for a message: its timestamp plus _id, so messages sharing a timestamp are not skipped. """
+    return f"{msg['timestamp'].isoformat()}_{msg['_id']}"
+
+
+def parse_cursor(value):
+    """ (timestamp, _id) from encode_cursor; a bare ISO timestamp (older clients) gives _id None. Raises ValueError. """
+    if not value:
+        return None
+    timestamp, _, object_id = value.partition("_")
+    try:
+        return datetime.fromisoformat(timestamp), ObjectId(object_id) if object_id else None
+    except InvalidId as e:
+        raise ValueError(str(e))
+
+
+def _cursor_query(cursor, op):
+    timestamp, object_id = cursor
+    if object_id is None:
+        return {"timestamp": {op: timestamp}}
+    return {"$or": [{"timestamp": {op: timestamp}}, {"timestamp": timestamp, "_id": {op: object_id}}]}
+
+
+def get_messages(user_id, chat_id, limit=DEFAULT_PAGE_SIZE, before=None, after=None):
+    """
+    One page of a chat, oldest first, served from the (user_id, chat_id, timestamp, _id) index.
+    Without cursors this is the latest `limit` messages; `before`/`after` (from parse_cursor)
+    page backwards/forwards from there. Returns (messages, has_more, before_cursor, after_cursor)
+    where has_more says whether older messages exist (or newer ones, when paging with `after`).
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    query = {"user_id": user_id, "chat_id": chat_id}
+    projection = {"user_id": 0, "chat_id": 0}
+
+    if after is not None:
+        query.update(_cursor_query(after, "$gt"))
+        order = ASCENDING
+    else:
+        if before is not None:
+            query.update(_cursor_query(before, "$lt"))
+        order = DESCENDING
+    messages = list(messages_collection.find(query, projection).sort([("timestamp", order), ("_id", order)]).limit(limit + 1))
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if order == DESCENDING:
+        messages.reverse()
+
+    before_cursor = encode_cursor(messages[0]) if messages else None
+    after_cursor = encode_cursor(messages[-1]) if messages else None
+    for msg in messages:
+        del msg["_id"]
+    return messages, has_more, before_cursor, after_cursor
+
+
+def build_chat_history(user_id) -> list[dict]:
+    """ The legacy chat_history layout, [{chat_id, chat_name, messages: [...]}, ...], for old clients. """
+    chats = {chat["chat_id"]: {**chat, "messages": []} for chat in list_chats(user_id)}
+    cursor = messages_collection.find({"user_id": user_id}, {"_id": 0, "user_id": 0}).sort("timestamp", ASCENDING)
+    for msg in cursor:
+        chat = chats.setdefault(msg["chat_id"], {"chat_id": msg["chat_id"], "chat_name": DEFAULT_CHAT_NAME, "messages": []})
+        chat["messages"].append({k: v for k, v in msg.items() if k != "chat_id"})
+    return list(chats.values())
+
+
+def iter_message_batches(start=None, end=None, user_id=None, batch_size=1000):
+    """
+    Yields lists of at most batch_size messages (with their chat_name), ordered by
+    user, chat and time, straight off a Mongo cursor so the full history is never
+    held in memory. start/end (datetimes) and user_id filter like usage_stats.
+    """
+    query = {}
+    if user_id:
+        query["user_id"] = user_id
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = start
+        if end:
+            query["timestamp"]["$lt"] = end
+
+    cursor = messages_collection.find(query, {"_id": 0}).sort(
+        [("user_id", ASCENDING), ("chat_id", ASCENDING), ("timestamp", ASCENDING)]
+    ).batch_size(batch_size)
+    chat_names = {}  # names of the current batch's chats, one lookup per batch
+    batch = []
+    for msg in cursor:
+        batch.append(msg)
+        if len(batch) >= batch_size:
+            yield _with_chat_names(batch, chat_names)
+            batch = []
+    if batch:
+        yield _with_chat_names(batch, chat_names)
+
+
+def _with_chat_names(batch, chat_names):
+    keys = {(m["user_id"], m["chat_id"]) for m in batch}
+    for key in chat_names.keys() - keys:
+        del chat_names[key]
+    missing = keys - chat_names.keys()
+    if missing:
+        for chat in chats_collection.find(
+            {"$or": [{"user_id": u, "chat_id": c} for u, c in missing]},
+            {"_id": 0, "user_id": 1, "chat_id": 1, "chat_name": 1}
+        ):
+            chat_names[(chat["user_id"], chat["chat_id"])] = chat["chat_name"]
+    for msg in batch:
+        msg["chat_name"] = chat_names.get((msg["user_id"], msg["chat_id"]), DEFAULT_CHAT_NAME)
+    return batch
+
+
+def usage_stats(start=None, end=None, user_id=None, sessions_limit=500) -> dict:
+    """
+    Admin analytics computed inside Mongo: per-session turns/last activity, per-user
+    totals and sessions per day. start/end (datetimes) and user_id filter the messages
+    before anything is grouped; only compact aggregates come back.
+    """
+    match = {}
+    if user_id:
+        match["user_id"] = user_id
+    if start or end:
+        match["timestamp"] = {}
+        if start:
+            match["timestamp"]["$gte"] = start
+        if end:
+            match["timestamp"]["$lt"] = end
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "chat_id": "$chat_id"},
+            "turns": {"$sum": 1},
+            "last_activity": {"$max": "$timestamp"}
+        }},
+        {"$facet": {
+            "totals": [
+                {"$group": {"_id": None, "sessions": {"$sum": 1}, "turns": {"$sum": "$turns"}}}
+            ],
+            "users": [
+                {"$group": {
+                    "_id": "$_id.user_id",
+                    "sessions": {"$sum": 1},
+                    "turns": {"$sum": "$turns"},
+                    "last_activity": {"$max": "$last_activity"}
+                }},
+                {"$sort": {"sessions": -1}}
+            ],
+            "sessions_per_day": [
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$last_activity"}},
+                    "count": {"$sum": 1}
+                }},
+                {"$sort": {"_id": 1}}
+            ],
+            "sessions": [
+                {"$sort": {"last_activity": -1}},
+                {"$limit": sessions_limit},
+                {"$lookup": {
+                    "from": "chats",
+                    "let": {"user_id": "$_id.user_id", "chat_id": "$_id.chat_id"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$and": [
+                            {"$eq": ["$user_id", "$$user_id"]},
+                            {"$eq": ["$chat_id", "$$chat_id"]}
+                        ]}}},
+                        {"$project": {"_id": 0, "chat_name": 1}}
+                    ],
+                    "as": "chat"
+                }}
+            ]
+        }}
+    ]
+    result = next(messages_collection.aggregate(pipeline), {})
+    totals = (result.get("totals") or [{}])[0]
+    return {
+        "total_sessions": totals.get("sessions", 0),
+        "total_turns": totals.get("turns", 0),
+        "users": [
+            {"user_id": u["_id"], "sessions": u["sessions"], "turns": u["turns"], "last_activity": u["last_activity"]}
+            for u in result.get("users", [])
+        ],
+        "sessions_per_day": [{"date": d["_id"], "count": d["count"]} for d in result.get("sessions_per_day", [])],
+        "sessions": [
+            {
+                "user_id": sess["_id"]["user_id"],
+                "chat_id": sess["_id"]["chat_id"],
+                "chat_name": sess["chat"][0]["chat_name"] if sess["chat"] else DEFAULT_CHAT_NAME,
+                "turns": sess["turns"],
+                "last_activity": sess["last_activity"]
+            }
+            for sess in result.get("sessions", [])
+        ]
+    }
@@ -1,28 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from pymongo import MongoClient
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
 import hashlib
+import json
 import os
+import zlib
 from bson import ObjectId
-from bson.objectid import ObjectId
 import random
 import string
 import uuid
-from main import run_qna_workflow
+from main import answer_question, stream_qna_workflow, semantic_cache, VECTORSTORE_NAME
+from agents.chatSessions import sessions
 from agents.imageQueryAgent import generate_query_from_image
+from agents.embeddingService import cache_stats
+from agents.answerRagAgent import vectorstore_path
+from agents.qnaStore import get_client
+from agents.indexingQueue import start_indexing_worker
+from serving import AdmissionController, install_admission_control, serve
+import chatStore
+import usageRollups
 
 load_dotenv()
-MONGODB_URI = os.getenv("MONGODB_URI")
 
 # -------------------- Initialize Flask App --------------------
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend-backend communication
+admission = AdmissionController()
+install_admission_control(app, admission)  # 429/503 + Retry-After when /ask etc. are saturated
 
 # -------------------- Connect to MongoDB --------------------
 try:
-    client = MongoClient(MONGODB_URI)
+    client = get_client()  # shared with the agents' in-process data access
     client.admin.command('ping')
     print("✅ MongoDB connection successful!")
 except Exception as e:
@@ -33,19 +42,12 @@ db = client["troubleshooter"]
 user_collection = db["user"]
 global_collection = db["qna"]
 user_credentials_collection = db["user_credentials"]
+chatStore.ensure_indexes()
 
 # -------------------- Routes --------------------
 
-@app.route("/ask", methods=["POST"])
-def ask_question():
-    data = request.json
-    user_id = data.get("user_id")
-    chat_id = data.get("chat_id")
-    question = data.get("question")
-    mode = data.get("mode", "Web Search")
-    timestamp = datetime.utcnow()
-
-    answer = run_qna_workflow(question)
+def save_chat_entry(user_id, chat_id, question, answer, mode, timestamp, route=None):
+    """ Appends a question/answer turn to the user's chat (one insert), bumps the usage rollups and returns its ques_id. """
     ques_id = str(uuid.uuid4())
 
     chat_entry = {
@@ -53,91 +55,95 @@ def ask_question():
         "question": question,
         "answer": answer,
         "mode": mode,
+        "route": route,
         "timestamp": timestamp
     }
 
+    # Creates the chat header ("Welcome Chat") if this chat_id is new
+    created = chatStore.append_message(user_id, chat_id, chat_entry)
+    usageRollups.record_question(user_id, timestamp, route, new_session=created)
+    autocomplete.add_question(question)
+    return ques_id
 
-    # Find the user, or initialize if not found
-    user_doc = user_collection.find_one({"user_id": user_id})
 
-    if not user_doc:
-        # If the user does not exist, initialize their document
-        user_collection.insert_one({
-            "user_id": user_id,
-            "chat_history": []  # Empty chat history for new user
-        })
-        user_doc = {"chat_history": []}  # Initialize chat history for new user
-
-    chat_history = user_doc.get("chat_history", [])
-
-    chat_found = False
-    for chat in chat_history:
-        if chat["chat_id"] == chat_id:
-            chat["messages"].append(chat_entry)
-            chat_found = True
-            break
-
-    if not chat_found:
-        # Create a new chat if no chat with the given chat_id exists
-        chat_name = "Welcome Chat"  # You can replace this with any default or generated chat name
-        chat_history.append({
-            "chat_id": chat_id,
-            "chat_name": chat_name,
-            "messages": [chat_entry]
-        })
+@app.route("/ask", methods=["POST"])
+def ask_question():
+    data = request.json
+    user_id = data.get("user_id")
+    chat_id = data.get("chat_id")
+    question = data.get("question")
+    mode = data.get("mode", "Web Search")
+    timestamp = datetime.utcnow()
 
-    # Update the user document with the new chat history
-    user_collection.update_one(
-        {"user_id": user_id},
-        {"$set": {"chat_history": chat_history}}
-    )
+    answer, route = answer_question(question, chat_id=chat_id)
+    ques_id = save_chat_entry(user_id, chat_id, question, answer, mode, timestamp, route)
 
     return jsonify({"status": "success", "answer": answer, "questionId": ques_id})
 
 
+# Same as /ask, but streams the answer as server-sent events while Gemini generates it.
+# The completed answer is persisted once the stream finishes.
+@app.route("/ask/stream", methods=["POST"])
+def ask_question_stream():
+    data = request.json
+    user_id = data.get("user_id")
+    chat_id = data.get("chat_id")
+    question = data.get("question")
+    mode = data.get("mode", "Web Search")
+    timestamp = datetime.utcnow()
+
+    def generate():
+        for event in stream_qna_workflow(question, chat_id=chat_id):
+            if event["type"] == "done":
+                event["questionId"] = save_chat_entry(user_id, chat_id, question, event["answer"], mode, timestamp, event["route"])
+            yield f"data: {json.dumps(event, default=str)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 
 # Get all chats of a user
 
 @app.route("/user/chats/<user_id>", methods=["GET"])
 def get_user_chats(user_id):
-    user_doc = user_collection.find_one({"user_id": user_id}, {"_id": 0, "chat_history": 1})
-    if not user_doc or "chat_history" not in user_doc:
-        return jsonify({"chats": []})
-
-    chat_history = user_doc["chat_history"]
-    chat_list = [{"chat_name": chat["chat_name"], "chat_id": chat["chat_id"]} for chat in chat_history]
-
+    chat_list = chatStore.list_chats(user_id)
     return jsonify({"chats": chat_list})
 
 
-# get a specific chat
-
-def convert_object_ids(obj):
-    if isinstance(obj, list):
-        return [convert_object_ids(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: convert_object_ids(value) for key, value in obj.items()}
-    elif isinstance(obj, ObjectId):
-        return str(obj)
-    return obj
+# get a specific chat, one page at a time
 
 @app.route("/user/chat/<user_id>/<chat_id>", methods=["GET"])
 def get_chat_by_id(user_id, chat_id):
+    """
+    Query params: limit (default 50), before / after (cursors from a previous page).
+    Without cursors the latest `limit` messages are returned.
+    """
     try:
-        user_doc = user_collection.find_one({"user_id": user_id}, {"_id": 0, "chat_history": 1})
-        if not user_doc or "chat_history" not in user_doc:
-            return jsonify({"error": "User or chat history not found"}), 404
-
-        for chat in user_doc["chat_history"]:
-            if chat.get("chat_id") == chat_id:
-                chat_cleaned = convert_object_ids(chat)
-                return jsonify({
-                    "chat_id": chat_cleaned.get("chat_id"),
-                    "chat_name": chat_cleaned.get("chat_name"),
-                    "messages": chat_cleaned.get("messages", [])
-                })
-
-        return jsonify({"error": "Chat not found"}), 404
+        chat = chatStore.get_chat(user_id, chat_id)
+        if not chat:
+            return jsonify({"error": "Chat not found"}), 404
+
+        try:
+            limit = int(request.args.get("limit", chatStore.DEFAULT_PAGE_SIZE))
+            before = chatStore.parse_cursor(request.args.get("before"))
+            after = chatStore.parse_cursor(request.args.get("after"))
+        except ValueError:
+            return jsonify({"error": "Invalid limit or cursor"}), 400
+
+        messages, has_more, before_cursor, after_cursor = chatStore.get_messages(
+            user_id, chat_id, limit=limit, before=before, after=after)
+        return jsonify({
+            "chat_id": chat.get("chat_id"),
+            "chat_name": chat.get("chat_name"),
+            "messages": messages,
+            "has_more": has_more,
+            "before_cursor": before_cursor,
+            "after_cursor": after_cursor
+        })
 
     except Exception as e:
         import traceback
@@ -154,20 +160,12 @@ def create_new_chat():
     chat_name = data.get("chat_name", "Welcome Chat")
     chat_id = str(uuid.uuid4())
 
-    user_doc = user_collection.find_one({"user_id": user_id})
+    user_doc = user_collection.find_one({"user_id": user_id}, {"_id": 1})
     if not user_doc:
         return jsonify({"error": "User not found"}), 404
 
-    new_chat = {
-        "chat_id": chat_id,
-        "chat_name": chat_name,
-        "messages": []
-    }
-
-    user_collection.update_one(
-        {"user_id": user_id},
-        {"$push": {"chat_history": new_chat}}
-    )
+    if chatStore.create_chat(user_id, chat_id, chat_name):
+        usageRollups.record_session(user_id, datetime.utcnow())
 
     return jsonify({"chat_id": chat_id, "chat_name": chat_name})
 
@@ -180,10 +178,7 @@ def delete_chat():
     user_id = data.get("user_id")
     chat_id = data.get("chat_id")
 
-    user_collection.update_one(
-        {"user_id": user_id},
-        {"$pull": {"chat_history": {"chat_id": chat_id}}}
-    )
+    chatStore.delete_chat(user_id, chat_id)
 
     return jsonify({"status": "success"})
 
@@ -193,7 +188,9 @@ def delete_chat():
 
 @app.route("/history/<user_id>", methods=["GET"])
 def get_user_history(user_id):
-    history = list(user_collection.find({"user_id": user_id}, {"_id": 0}))
+    if not user_collection.find_one({"user_id": user_id}, {"_id": 1}):
+        return jsonify([])
+    history = [{"user_id": user_id, "chat_history": chatStore.build_chat_history(user_id)}]
     return jsonify(history)
 
 @app.route("/qna/<ques_id>", methods=["GET"])
@@ -205,12 +202,12 @@ def get_answer_by_ques_id(ques_id):
 
 @app.route("/user/questions/<user_id>", methods=["GET"])
 def get_user_questions(user_id):
-    user_doc = user_collection.find_one({"user_id": user_id}, {"_id": 0, "chat_history.question": 1})
-    
-    if not user_doc or "chat_history" not in user_doc:
+    cursor = chatStore.messages_collection.find({"user_id": user_id}, {"_id": 0, "question": 1}).sort("timestamp", 1)
+    questions = [entry["question"] for entry in cursor if "question" in entry]
+
+    if not questions:
         return jsonify({"error": "No history found for this user"}), 404
 
-    questions = [entry["question"] for entry in user_doc["chat_history"] if "question" in entry]
     return jsonify({"user_id": user_id, "questions": questions})
 
 
@@ -255,16 +252,9 @@ def signup_user():
     chat_id = str(uuid.uuid4())  # New chat ID
     chat_name = "Welcome Chat"  # First chat for the user
 
-    user_collection.insert_one({
-        "user_id": user_id,
-        "chat_history": [
-            {
-                "chat_id": chat_id,
-                "chat_name": chat_name,
-                "messages": []  # Empty messages for the welcome chat
-            }
-        ]
-    })
+    user_collection.insert_one({"user_id": user_id})
+    if chatStore.create_chat(user_id, chat_id, chat_name):
+        usageRollups.record_session(user_id, datetime.utcnow())
 
     return jsonify({"status": "success", "user_id": user_id})
 
@@ -274,7 +264,7 @@ def signup_user():
 
 # ---------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-# route to get answer using question object id 
+# route to get answer using question object id (for external clients; agents use agents.qnaStore)
 @app.route('/get-answer', methods=['GET'])
 def get_answer_by_object_id():
     object_id = request.args.get("objectId")
@@ -319,7 +309,7 @@ def add_qna():
 
 
 # ---------------Suggestion Generation------------------
-from agents.autocompleteAgent import get_matlab_suggestions
+import agents.autocompleteAgent as autocomplete
 
 @app.route("/suggest", methods=["GET"])
 def suggest():
@@ -328,7 +318,7 @@ def suggest():
     if not query:
         return jsonify(suggestions=[])
     
-    suggestions = get_matlab_suggestions(query)
+    suggestions = autocomplete.suggest(query)  # local prefix index, Gemini only when it has < 3 hits
     return jsonify(suggestions=suggestions)
 
 
@@ -361,17 +351,113 @@ def get_all_users():
 
 
 
-# 2) Dump raw user_collection for admin download
-@app.route("/admin/raw_logs", methods=["GET"])
-def get_raw_logs():
+# Pre-aggregated usage counters (constant-time dashboard load)
+@app.route("/admin/rollups", methods=["GET"])
+def get_admin_rollups():
+    """ Query params: days (only the most recent N days of per-day counters). """
     try:
-        users_cursor = user_collection.find({}, {"_id": 0})
-        users = list(users_cursor)
-        return jsonify(users)
+        rollups = usageRollups.get_rollups(request.args.get("days"))
+        usernames = {
+            u["user_id"]: u["username"]
+            for u in user_credentials_collection.find({}, {"_id": 0, "user_id": 1, "username": 1})
+        }
+        for row in rollups["users"]:
+            row["username"] = usernames.get(row["user_id"], row["user_id"])
+        rollups["total_users"] = len(usernames)
+        return jsonify(rollups)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def parse_date_range():
+    """ start/end query params (YYYY-MM-DD, end inclusive) as a [start, end) datetime range. """
+    start = request.args.get("start")
+    end = request.args.get("end")
+    start = datetime.fromisoformat(start) if start else None
+    end = datetime.fromisoformat(end) + timedelta(days=1) if end else None
+    return start, end
+
+
+# Aggregated analytics for the admin dashboard (filters are applied inside Mongo)
+@app.route("/admin/stats", methods=["GET"])
+def get_admin_stats():
+    """
+    Query params: start, end (YYYY-MM-DD, end inclusive), user_id, sessions_limit.
+    Returns totals, per-user sessions/turns/last activity, sessions per day and
+    the most recent sessions, with usernames filled in.
+    """
+    try:
+        start, end = parse_date_range()
+        sessions_limit = int(request.args.get("sessions_limit", 500))
+    except ValueError:
+        return jsonify({"error": "Invalid date or limit"}), 400
+
+    try:
+        stats = chatStore.usage_stats(start, end, request.args.get("user_id"), sessions_limit)
+        usernames = {
+            u["user_id"]: u["username"]
+            for u in user_credentials_collection.find({}, {"_id": 0, "user_id": 1, "username": 1})
+        }
+        for row in stats["users"] + stats["sessions"]:
+            row["username"] = usernames.get(row["user_id"], row["user_id"])
+        stats["total_users"] = len(usernames)
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# 2) Stream the raw chat logs for admin download
+@app.route("/admin/raw_logs", methods=["GET"])
+def get_raw_logs():
+    """
+    Newline-delimited JSON, one message per line ({user_id, chat_id, chat_name, ques_id,
+    question, answer, mode, route, timestamp}), streamed from a cursor in batches.
+    Query params: start, end (YYYY-MM-DD, end inclusive), user_id, gzip=1, batch_size.
+    """
+    try:
+        start, end = parse_date_range()
+        batch_size = max(1, min(int(request.args.get("batch_size", 1000)), 10000))
+    except ValueError:
+        return jsonify({"error": "Invalid date or batch size"}), 400
+    compress = request.args.get("gzip") in ("1", "true")
+    user_id = request.args.get("user_id")
+
+    def generate():
+        gzipper = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip container
+        for batch in chatStore.iter_message_batches(start, end, user_id, batch_size):
+            chunk = "".join(json.dumps(msg, default=json_default) + "\n" for msg in batch).encode("utf-8")
+            if gzipper:
+                chunk = gzipper.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+        if gzipper:
+            yield gzipper.flush()
+
+    filename = "logs.ndjson.gz" if compress else "logs.ndjson"
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={filename}", "X-Accel-Buffering": "no"}
+    )
+
+
+def json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+# Embedding / semantic answer cache hit/miss counters
+@app.route("/admin/cache_stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify({
+        "embedding_cache": cache_stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "chat_sessions": sessions.stats(),
+        "admission": admission.stats(),
+        "autocomplete": {"phrases": len(autocomplete.index)}
+    })
+
+
 #3 Return full chat_history for one user ———
 @app.route("/hist/<user_id>", methods=["GET"])
 def get_user_history_chat(user_id):
@@ -380,13 +466,9 @@ def get_user_history_chat(user_id):
       [ { user_id, chat_history: [ { chat_id, chat_name, messages: […] }, … ] } ]
     """
     try:
-        # find all docs for this user (should normally be one)
-        docs = list(
-            user_collection.find(
-                {"user_id": user_id},
-                {"_id": 0, "user_id": 1, "chat_history": 1}
-            )
-        )
+        if not user_collection.find_one({"user_id": user_id}, {"_id": 1}):
+            return jsonify([])
+        docs = [{"user_id": user_id, "chat_history": chatStore.build_chat_history(user_id)}]
         return jsonify(docs)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -396,4 +478,16 @@ def get_user_history_chat(user_id):
 
 # -------------------- Run App --------------------
 if __name__ == "__main__":
-    app.run(debug=True)
+    import sys
+    if "--serve" in sys.argv:
+        # python database.py --serve  (production: no reloader, bounded admission)
+        start_indexing_worker()
+        autocomplete.start_index_build(vectorstore_path(VECTORSTORE_NAME))
+        serve(app)
+    else:
+        # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves
+        # requests, so only it replays and drains the indexing queue and builds the autocomplete index.
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            start_indexing_worker()
+            autocomplete.start_index_build(vectorstore_path(VECTORSTORE_NAME))
+        app.run(debug=True)
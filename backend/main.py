@@ -1,17 +1,23 @@
 from langgraph.graph import StateGraph, END
 from typing import TypedDict
+import os
 import random
 import string
-from agents.answerQnaAgent import AnswerQnaAgent
-from agents.answerRagAgent import AnswerRagAgent
+from concurrent.futures import ThreadPoolExecutor
+from agents.answerQnaAgent import AnswerQnaAgent, build_qna_prompt
+from agents.answerRagAgent import AnswerRagAgent, retrieve_rag_docs, vectorstore_path, build_rag_prompt
 from agents.decisionAgents import isQueryRelevantAgent
-from agents.intialAnsweringAgent import InitialAnsweringAgent
-from agents.qnaDbAgents import QuestionFinderAgent,add_qna_to_backend
+from agents.intialAnsweringAgent import InitialAnsweringAgent, build_initial_prompt
+from agents.qnaDbAgents import QuestionFinderAgent
+from agents.indexingQueue import enqueue_qna
+from agents.semanticCache import SemanticCache
+from agents.chatSessions import sessions
 
 # -------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
 class GraphState(TypedDict):
     question: str
+    chat_id: str | None  # conversation whose LLM session the answer goes through
     query_relevance: str  # will hold "yes" or "no"
     x: list|str  # hold the formatted documents (question + objectID)
     final_answer: object
@@ -39,7 +45,7 @@ def InitialAnsweringNode(state: GraphState) -> GraphState:
     """ Returns an answer directly for irrelevant queries. """
     print("🤖 Providing initial answer...")
     query = state["question"]
-    answer = InitialAnsweringAgent(query)
+    answer = InitialAnsweringAgent(query, chat_id=state.get("chat_id"))
     state["final_answer"] = answer
     return state
 
@@ -69,26 +75,30 @@ def AnswerQnaNode(state: GraphState) -> GraphState:
     print("🤖 Answering using QnA...")
     query = state["question"]
     related_qa = state["x"]
-    answer = AnswerQnaAgent(query, related_qa)
+    answer = AnswerQnaAgent(query, related_qa, chat_id=state.get("chat_id"))
     state["final_answer"] = answer
     return state
 
+VECTORSTORE_NAME = "faiss_vector_store"
+
 def AnswerRagNode(state: GraphState) -> GraphState:
     """ Generate final answer using RAG (Retrieval-Augmented Generation) Node. """
     print("🤖 Answering using RAG...")
     query = state["question"]
-    vectorstore_name = "faiss_vector_store"
-    answer = AnswerRagAgent(query, vectorstore_name)
+    answer = AnswerRagAgent(query, VECTORSTORE_NAME, chat_id=state.get("chat_id"))
     state["final_answer"] = answer
     return state
 
 def add_qna_to_backendNode(state: GraphState) -> GraphState:
-    """ Add question and answer to the backend database. """
+    """ Queue the question and answer for the backend database; indexing happens in the background. """
     print("🤖 Adding QnA to backend...")
     question = state["question"]
     answer = state["final_answer"]
-    object_id = add_qna_to_backend(question, answer)
-    print(f"QnA added with Object ID: {object_id}")
+    if not isinstance(answer, dict):
+        print("Skipping QnA indexing for a failed answer.")
+        return state
+    object_id = enqueue_qna(question, answer)
+    print(f"QnA queued with Object ID: {object_id}")
     return state
 
 # -------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
@@ -130,16 +140,135 @@ app = workflow.compile()
 
 # --------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-def run_qna_workflow(query: str) -> str:
-    """Runs the QnA LangGraph workflow and returns the final answer."""
-    input_state = {
+# "sequential" runs the LangGraph above; "concurrent" starts relevance check, qnaDB
+# search + validation and RAG retrieval together (lower latency, but the qnaDB and
+# RAG LLM calls are also paid for queries that turn out to be irrelevant).
+WORKFLOW_MODE = os.getenv("QNA_WORKFLOW_MODE", "sequential")
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("QNA_WORKFLOW_THREADS", "12")), thread_name_prefix="qna-workflow")
+
+
+def _new_state(query: str, chat_id=None) -> GraphState:
+    return {
         "question": query,
+        "chat_id": chat_id,
         "query_relevance": "",  
         "x": "",                 
         "final_answer": ""       
     }
-    final_state = app.invoke(input_state)
-    return final_state.get("final_answer", "⚠️ No answer generated.")
+
+
+def answer_route(state: GraphState) -> str:
+    """ Which branch produced the final answer: "initial", "qna" or "rag". """
+    if checkRelevance(state) == "no":
+        return "initial"
+    return "qna" if checkRedundence(state) == "yes" else "rag"
+
+
+def run_qna_workflow_concurrent(query: str, chat_id=None) -> GraphState:
+    """ Fans out all three branches at once and lets the graph's routers pick the winner. """
+    state = _new_state(query, chat_id)
+    relevance_future = _executor.submit(isQueryRelevantAgent, query)
+    qna_future = _executor.submit(QuestionFinderAgent, query, 4)
+    rag_future = _executor.submit(retrieve_rag_docs, query, VECTORSTORE_NAME)
+
+    state["query_relevance"] = relevance_future.result()
+    print(f"Query relevance: {state['query_relevance']}")
+    if checkRelevance(state) == "no":
+        # Losing branches are cancelled if still queued; running ones finish and are ignored.
+        qna_future.cancel()
+        rag_future.cancel()
+        return InitialAnsweringNode(state)
+
+    state["x"] = qna_future.result()
+    if checkRedundence(state) == "yes":
+        rag_future.cancel()
+        return AnswerQnaNode(state)
+
+    print("🤖 Answering using RAG...")
+    try:
+        docs = rag_future.result()
+    except Exception as e:
+        state["final_answer"] = f"❌ Error: {str(e)}"
+        return state
+    state["final_answer"] = AnswerRagAgent(query, VECTORSTORE_NAME, final_docs=docs, chat_id=chat_id)
+    return add_qna_to_backendNode(state)
+
+
+# Near-duplicate questions are answered from here without any LLM call. Only
+# documentation-backed answers (with links) are cached; small talk is not.
+semantic_cache = SemanticCache(vectorstore_path(VECTORSTORE_NAME))
+
+
+def answer_question(query: str, mode: str | None = None, chat_id: str | None = None):
+    """ Runs the QnA workflow and returns (final_answer, route), route being "cache", "initial", "qna" or "rag". """
+    cached_answer = semantic_cache.lookup(query)
+    if cached_answer is not None:
+        # Keep the conversation's LLM session aware of the turn it did not generate.
+        sessions.record_turn(chat_id, query, cached_answer["answer"])
+        return cached_answer, "cache"
+
+    if (mode or WORKFLOW_MODE) == "concurrent":
+        final_state = run_qna_workflow_concurrent(query, chat_id)
+    else:
+        input_state = _new_state(query, chat_id)
+        final_state = app.invoke(input_state)
+    final_answer = final_state.get("final_answer") or "⚠️ No answer generated."
+
+    if isinstance(final_answer, dict) and final_answer.get("contributing_links"):
+        semantic_cache.store(query, final_answer)
+    return final_answer, answer_route(final_state)
+
+
+def run_qna_workflow(query: str, mode: str | None = None, chat_id: str | None = None) -> str:
+    """Runs the QnA LangGraph workflow and returns the final answer."""
+    return answer_question(query, mode, chat_id)[0]
+
+def stream_qna_workflow(query: str, chat_id: str | None = None):
+    """
+    Streaming variant of run_qna_workflow. Routing and retrieval run as usual, then
+    the final Gemini generation is streamed. Yields events:
+      {"type": "chunk", "text": ...} for each piece of the answer,
+      {"type": "done", "answer": {"answer", "contributing_links"}, "route": ...} at the end, or
+      {"type": "error", "message": ...} if anything fails.
+    """
+    cached_answer = semantic_cache.lookup(query)
+    if cached_answer is not None:
+        sessions.record_turn(chat_id, query, cached_answer["answer"])
+        yield {"type": "chunk", "text": cached_answer["answer"]}
+        yield {"type": "done", "answer": cached_answer, "route": "cache"}
+        return
+
+    try:
+        route = "initial"
+        links = []
+        if isQueryRelevantAgent(query) != "yes":
+            prompt = build_initial_prompt(query)
+        else:
+            related_qa = QuestionFinderAgent(query, k=4)
+            if related_qa != "no":
+                route = "qna"
+                prompt, links = build_qna_prompt(query, related_qa)
+            else:
+                route = "rag"
+                prompt, links = build_rag_prompt(query, retrieve_rag_docs(query, VECTORSTORE_NAME))
+        print(f"🤖 Streaming answer ({route})...")
+
+        parts = []
+        for chunk in sessions.send_message(chat_id, prompt, stream=True):
+            text = chunk.text.lower() if route == "qna" else chunk.text  # same casing as AnswerQnaAgent
+            parts.append(text)
+            yield {"type": "chunk", "text": text}
+    except Exception as e:
+        yield {"type": "error", "message": f"❌ Error: {str(e)}"}
+        return
+
+    answer = {"answer": "".join(parts).strip(), "contributing_links": links}
+    sessions.record_turn(chat_id, query, answer["answer"])
+    if route == "rag":
+        add_qna_to_backendNode({**_new_state(query, chat_id), "final_answer": answer})
+    if links:
+        semantic_cache.store(query, answer)
+    yield {"type": "done", "answer": answer, "route": route}
 
 # --------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
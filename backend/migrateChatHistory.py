@@ -0,0 +1,74 @@
+"""
+One-shot migration from the embedded user.chat_history arrays to the
+normalized chats/messages collections (see chatStore.py).
+
+Run from the backend directory:
+    python migrateChatHistory.py              # migrate and drop chat_history from user docs
+    python migrateChatHistory.py --keep-legacy  # migrate but leave chat_history in place
+    python migrateChatHistory.py --dry-run      # only count what would be migrated
+
+Safe to re-run: chat headers are upserted and messages are upserted on ques_id.
+"""
+import sys
+import uuid
+from datetime import datetime
+from pymongo import UpdateOne
+import chatStore
+
+BATCH_SIZE = 1000
+
+
+def legacy_ques_id(user_id, chat_id, index, timestamp) -> str:
+    """ Stable ques_id for a legacy message without one, so re-runs upsert instead of duplicating it. """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"chat_history/{user_id}/{chat_id}/{index}/{timestamp}"))
+
+
+def migrate_user(user_doc, dry_run=False):
+    user_id = user_doc["user_id"]
+    ops = []
+    chats = 0
+    for chat in user_doc.get("chat_history", []):
+        messages = chat.get("messages", [])
+        created_at = messages[0].get("timestamp") if messages and messages[0].get("timestamp") else datetime.utcnow()
+        chats += 1
+        if not dry_run:
+            chatStore.create_chat(user_id, chat["chat_id"], chat.get("chat_name", chatStore.DEFAULT_CHAT_NAME), created_at)
+        for index, msg in enumerate(messages):
+            msg = {**msg, "user_id": user_id, "chat_id": chat["chat_id"]}
+            msg.setdefault("ques_id", legacy_ques_id(user_id, chat["chat_id"], index, msg.get("timestamp")))
+            msg.setdefault("timestamp", created_at)
+            fields = {k: v for k, v in msg.items() if k != "ques_id"}
+            ops.append(UpdateOne({"ques_id": msg["ques_id"]}, {"$setOnInsert": fields}, upsert=True))
+        if not dry_run and messages:
+            chatStore.chats_collection.update_one(
+                {"user_id": user_id, "chat_id": chat["chat_id"]},
+                {"$max": {"updated_at": messages[-1].get("timestamp", created_at)}}
+            )
+
+    if not dry_run:
+        for i in range(0, len(ops), BATCH_SIZE):
+            chatStore.messages_collection.bulk_write(ops[i:i + BATCH_SIZE], ordered=False)
+    return chats, len(ops)
+
+
+def main():
+    dry_run = "--dry-run" in sys.argv
+    keep_legacy = "--keep-legacy" in sys.argv or dry_run
+    chatStore.ensure_indexes()
+    user_collection = chatStore.db["user"]
+
+    users = total_chats = total_messages = 0
+    for user_doc in user_collection.find({"chat_history": {"$exists": True}}, {"_id": 0, "user_id": 1, "chat_history": 1}):
+        chats, messages = migrate_user(user_doc, dry_run)
+        if not keep_legacy:
+            user_collection.update_one({"user_id": user_doc["user_id"]}, {"$unset": {"chat_history": ""}})
+        users += 1
+        total_chats += chats
+        total_messages += messages
+        print(f"{'🔎' if dry_run else '✅'} {user_doc['user_id']}: {chats} chats, {messages} messages")
+
+    print(f"{'Would migrate' if dry_run else 'Migrated'} {users} users, {total_chats} chats, {total_messages} messages.")
+
+
+if __name__ == "__main__":
+    main()
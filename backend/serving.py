@@ -0,0 +1,100 @@
+import os
+import threading
+from flask import request, g, jsonify
+
+# Bounded admission / backpressure for the expensive (LLM-backed) routes.
+#
+# At most MAX_IN_FLIGHT requests run at once; up to MAX_QUEUED more wait for a
+# slot for at most QUEUE_TIMEOUT_S. Anything beyond that is turned away
+# immediately with 429, and a request that times out in the queue gets 503.
+# Both carry Retry-After so clients back off instead of piling up threads.
+#
+# This is not an async serving mode: every admitted /ask still holds one
+# server thread while it waits on Gemini and Mongo, so throughput is bounded
+# by MAX_IN_FLIGHT / SERVE_THREADS, not by I/O concurrency. An async /ask
+# (generate_content_async, an async Mongo driver, async graph nodes behind an
+# ASGI adapter) is still open.
+
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "8"))
+MAX_QUEUED = int(os.getenv("MAX_QUEUED", "16"))
+QUEUE_TIMEOUT_S = float(os.getenv("QUEUE_TIMEOUT_S", "10"))
+RETRY_AFTER_S = int(os.getenv("RETRY_AFTER_S", "5"))
+
+# /suggest is served from the local prefix index and limits its own LLM fallback.
+LIMITED_PATHS = ("/ask", "/ask/stream", "/image-to-query")
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queued=MAX_QUEUED, queue_timeout_s=QUEUE_TIMEOUT_S):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout_s = queue_timeout_s
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Returns None when admitted, otherwise the HTTP status to reject with. """
+        if self._slots.acquire(blocking=False):
+            return None
+        with self._lock:
+            if self.queued >= self.max_queued:
+                self.rejected += 1
+                return 429
+            self.queued += 1
+        admitted = self._slots.acquire(timeout=self.queue_timeout_s)
+        with self._lock:
+            self.queued -= 1
+            if not admitted:
+                self.timed_out += 1
+        return None if admitted else 503
+
+    def release(self):
+        self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queued": self.max_queued,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+
+def install_admission_control(app, controller: AdmissionController, paths=LIMITED_PATHS):
+    @app.before_request
+    def _admit():
+        if request.path not in paths:
+            return None
+        status = controller.acquire()
+        if status is None:
+            g.admitted = True
+            return None
+        response = jsonify({"error": "Server busy, please retry shortly."})
+        response.status_code = status
+        response.headers["Retry-After"] = str(RETRY_AFTER_S)
+        return response
+
+    # For streamed responses this runs when the stream ends, so the slot is
+    # held for the whole generation.
+    @app.teardown_request
+    def _release(exc):
+        if g.pop("admitted", False):
+            controller.release()
+
+
+def serve(app, host="0.0.0.0", port=5000):
+    """ Production serving: a thread-per-request WSGI server (no debug reloader) behind the admission limiter. """
+    threads = int(os.getenv("SERVE_THREADS", str(MAX_IN_FLIGHT + MAX_QUEUED + 8)))
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print("⚠️ waitress not installed, falling back to Flask's threaded server.")
+        app.run(host=host, port=port, debug=False, threaded=True)
+        return
+    print(f"🚀 Serving on {host}:{port} with {threads} threads (max {MAX_IN_FLIGHT} in flight, {MAX_QUEUED} queued).")
+    waitress_serve(app, host=host, port=port, threads=threads)
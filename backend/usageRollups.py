@@ -0,0 +1,126 @@
+import sys
+from pymongo import UpdateOne
+from agents.qnaStore import get_db
+
+# Pre-aggregated usage counters for the admin dashboard.
+#
+#   {_id: "global"}              sessions, questions, routes.{cache,initial,qna,rag}
+#   {_id: "day:YYYY-MM-DD"}      date, sessions, questions, routes.*
+#   {_id: "user:<user_id>"}      user_id, sessions, questions, last_activity
+#
+# /ask and /create-chat bump them with $inc as they write, so the dashboard
+# reads a handful of small documents however long the history is. Each counter
+# document is updated atomically; they can be rebuilt from the chats/messages
+# collections (run from the backend directory):
+#     python usageRollups.py backfill
+
+db = get_db()
+rollups_collection = db["usage_rollups"]
+
+def _day(timestamp) -> str:
+    return timestamp.strftime("%Y-%m-%d")
+
+
+def _apply(user_id, timestamp, sessions=0, questions=0, route=None):
+    inc = {"sessions": sessions, "questions": questions}
+    if route:
+        inc[f"routes.{route}"] = questions
+    day = _day(timestamp)
+    ops = [
+        UpdateOne({"_id": "global"}, {"$inc": inc}, upsert=True),
+        UpdateOne({"_id": f"day:{day}"}, {"$inc": inc, "$setOnInsert": {"date": day}}, upsert=True),
+        UpdateOne(
+            {"_id": f"user:{user_id}"},
+            {
+                "$inc": {"sessions": sessions, "questions": questions},
+                "$max": {"last_activity": timestamp},
+                "$setOnInsert": {"user_id": user_id}
+            },
+            upsert=True
+        ),
+    ]
+    try:
+        rollups_collection.bulk_write(ops, ordered=False)
+    except Exception as e:
+        # Counters are best effort; a backfill brings them back in line.
+        print(f"⚠️ Could not update usage rollups: {e}")
+
+
+def record_session(user_id, timestamp):
+    """ A chat was created. """
+    _apply(user_id, timestamp, sessions=1)
+
+
+def record_question(user_id, timestamp, route, new_session=False):
+    """ A question was answered by `route`; new_session if the message also created its chat. """
+    _apply(user_id, timestamp, sessions=int(new_session), questions=1, route=route)
+
+
+def get_rollups(days=None) -> dict:
+    """ Totals, per-day counters (oldest first, optionally only the last `days`) and per-user counters. """
+    totals = rollups_collection.find_one({"_id": "global"}, {"_id": 0}) or {}
+    day_cursor = rollups_collection.find({"_id": {"$regex": "^day:"}}, {"_id": 0}).sort("_id", -1)
+    if days:
+        day_cursor = day_cursor.limit(int(days))
+    users = rollups_collection.find({"_id": {"$regex": "^user:"}}, {"_id": 0}).sort("sessions", -1)
+    return {
+        "total_sessions": totals.get("sessions", 0),
+        "total_questions": totals.get("questions", 0),
+        "routes": totals.get("routes", {}),
+        "days": list(day_cursor)[::-1],
+        "users": list(users)
+    }
+
+
+def backfill():
+    """
+    Recomputes every counter from the chats and messages collections into a scratch
+    collection and swaps it in with a single rename. Messages stored before routes
+    were recorded count under routes.unknown. Increments landing while it runs are
+    lost, so run it when the server is quiet.
+    """
+    chats = db["chats"]
+    messages = db["messages"]
+    docs = {"global": {"_id": "global", "sessions": 0, "questions": 0, "routes": {}}}
+
+    def day_doc(day):
+        return docs.setdefault(f"day:{day}", {"_id": f"day:{day}", "date": day, "sessions": 0, "questions": 0, "routes": {}})
+
+    def user_doc(user_id):
+        return docs.setdefault(f"user:{user_id}", {"_id": f"user:{user_id}", "user_id": user_id, "sessions": 0, "questions": 0, "last_activity": None})
+
+    day_format = {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}
+    for row in chats.aggregate([{"$group": {"_id": {"user_id": "$user_id", "day": day_format}, "count": {"$sum": 1}}}]):
+        docs["global"]["sessions"] += row["count"]
+        day_doc(row["_id"]["day"])["sessions"] += row["count"]
+        user_doc(row["_id"]["user_id"])["sessions"] += row["count"]
+
+    day_format = {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+    pipeline = [{"$group": {
+        "_id": {"user_id": "$user_id", "day": day_format, "route": {"$ifNull": ["$route", "unknown"]}},
+        "count": {"$sum": 1},
+        "last_activity": {"$max": "$timestamp"}
+    }}]
+    for row in messages.aggregate(pipeline, allowDiskUse=True):
+        count, route = row["count"], row["_id"]["route"]
+        for doc in (docs["global"], day_doc(row["_id"]["day"])):
+            doc["questions"] += count
+            doc["routes"][route] = doc["routes"].get(route, 0) + count
+        user = user_doc(row["_id"]["user_id"])
+        user["questions"] += count
+        if user["last_activity"] is None or row["last_activity"] > user["last_activity"]:
+            user["last_activity"] = row["last_activity"]
+
+    scratch = db["usage_rollups_backfill"]
+    scratch.drop()
+    scratch.insert_many(list(docs.values()))
+    scratch.rename(rollups_collection.name, dropTarget=True)
+    print(f"✅ Usage rollups rebuilt: {docs['global']['sessions']} sessions, {docs['global']['questions']} questions, "
+          f"{sum(1 for k in docs if k.startswith('day:'))} days, {sum(1 for k in docs if k.startswith('user:'))} users.")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["backfill"]:
+        backfill()
+    else:
+        print("Usage: python usageRollups.py backfill")
@@ -1,11 +1,39 @@
 import streamlit as st
 import requests
 import pandas as pd
+import os
 import json
-from datetime import datetime
+import tempfile
 import matplotlib.pyplot as plt
 
 BACKEND_URL = "http://127.0.0.1:5000/"  # Ensure this matches your Flask server URL
+SESSION_PAGE_SIZE = 100
+
+
+def fetch_stats(params=None):
+    """ Aggregated dashboard data from /admin/stats; None if the request fails. """
+    res = requests.get(f"{BACKEND_URL}/admin/stats", params=params or {})
+    if res.status_code != 200:
+        return None
+    return res.json()
+
+
+def fetch_raw_logs(params, compress):
+    """
+    Streams /admin/raw_logs to a temporary file on the Streamlit server and returns
+    its path (the caller removes it); None if the request fails. The download
+    itself is not streamed: st.download_button reads the whole file into memory.
+    """
+    if compress:
+        params = {**params, "gzip": 1}
+    with requests.get(f"{BACKEND_URL}/admin/raw_logs", params=params, stream=True) as res:
+        if res.status_code != 200:
+            return None
+        with tempfile.NamedTemporaryFile(suffix=".ndjson", delete=False) as export:
+            for chunk in res.iter_content(chunk_size=64 * 1024):
+                export.write(chunk)
+    return export.name
+
 
 def admin():
     # Authentication check
@@ -15,163 +43,155 @@ def admin():
 
     st.title("🛠️ Admin Dashboard")
 
-    # 1) Fetch all users from the Flask API
+    # 1) Fetch all users (for the filters) and the usage rollups from the Flask API
     users_res = requests.get(f"{BACKEND_URL}/admin/users")
     if users_res.status_code != 200:
         st.error("Failed to fetch users.")
         st.stop()
     users = users_res.json().get("users", [])  # [{ "user_id": "...", "username": "..." }, …]
 
-    # 2) Build a flat list of all sessions by calling /history/<user_id>
-    sessions = []
-    for u in users:
-        hist_res = requests.get(f"{BACKEND_URL}/history/{u['user_id']}")
-        if hist_res.status_code != 200:
-            continue
-        hist = hist_res.json()
-        for doc in hist:
-            for chat in doc.get("chat_history", []):
-                messages = chat.get("messages", [])
-                if messages:
-                    sessions.append({
-                        "user_id": u["user_id"],
-                        "username": u["username"],
-                        "chat_id": chat["chat_id"],
-                        "chat_name": chat["chat_name"],
-                        "timestamp": messages[-1]["timestamp"],
-                        "turns": len(messages)
-                    })
-
-    df = pd.DataFrame(sessions)
+    rollups_res = requests.get(f"{BACKEND_URL}/admin/rollups")
+    if rollups_res.status_code != 200:
+        st.error("Failed to fetch admin statistics.")
+        st.stop()
+    rollups = rollups_res.json()  # pre-aggregated counters, independent of history size
 
     # 3) Global metrics
     st.subheader("Global Statistics")
-    c1, c2, c3 = st.columns(3)
-    c1.metric("Total Users", len(users))
-    c2.metric("Total Chat Sessions", len(df))
-    avg = round(len(df) / len(users), 2) if users else 0
-    c3.metric("Avg Sessions/User", avg)
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Total Users", rollups["total_users"])
+    c2.metric("Total Chat Sessions", rollups["total_sessions"])
+    c3.metric("Total Questions", rollups["total_questions"])
+    avg = round(rollups["total_sessions"] / rollups["total_users"], 2) if rollups["total_users"] else 0
+    c4.metric("Avg Sessions/User", avg)
+
+    if rollups["routes"]:
+        st.caption("Answers by route: " + ", ".join(f"{route}: {count}" for route, count in sorted(rollups["routes"].items())))
 
-    # 4) Sessions‑per‑day chart
+    # 4) Sessions‑ and questions‑per‑day chart
     st.subheader("Sessions Over Time")
-    if not df.empty:
-        df["date"] = pd.to_datetime(df["timestamp"]).dt.date
-        ts = df.groupby("date").size().reset_index(name="count")
+    days = pd.DataFrame(rollups["days"])
+    if not days.empty:
+        days["date"] = pd.to_datetime(days["date"]).dt.date
         fig, ax = plt.subplots()
-        ax.plot(ts["date"], ts["count"])
+        ax.plot(days["date"], days["sessions"], label="Sessions")
+        ax.plot(days["date"], days["questions"], label="Questions")
         ax.set_xlabel("Date")
-        ax.set_ylabel("Sessions")
-        ax.tick_params(axis='x', labelrotation=90)  # :contentReference[oaicite:0]{index=0}
+        ax.set_ylabel("Count")
+        ax.legend()
+        ax.tick_params(axis='x', labelrotation=90)
         st.pyplot(fig)
     else:
         st.info("No session data available to display.")
-        
+
+    user_stats = pd.DataFrame(rollups["users"])
+
     # Bar chart of top users
     st.subheader("Top Users by # of Sessions")
-    user_counts = df["username"].value_counts().head(10)
-    fig2, ax2 = plt.subplots()
-    ax2.bar(user_counts.index, user_counts.values)
-    ax2.set_title("Top 10 Users") 
-    ax2.set_xlabel("Username")
-    ax2.set_ylabel("Session Count")
-    ax2.tick_params(axis='x', labelrotation=90)  # rotate labels :contentReference[oaicite:2]{index=2}
-    st.pyplot(fig2)
-    
+    if not user_stats.empty:
+        top = user_stats.head(10)
+        fig2, ax2 = plt.subplots()
+        ax2.bar(top["username"], top["sessions"])
+        ax2.set_title("Top 10 Users")
+        ax2.set_xlabel("Username")
+        ax2.set_ylabel("Session Count")
+        ax2.tick_params(axis='x', labelrotation=90)
+        st.pyplot(fig2)
 
     # 5) Per‑user table & export
     st.subheader("Per‑User Summary")
-    if not df.empty:
-        user_stats = df.groupby("username").agg(
-            sessions=("chat_id", "nunique"),
-            last_activity=("date", "max")
-        ).reset_index()
+    if not user_stats.empty:
+        user_stats["last_activity"] = pd.to_datetime(user_stats["last_activity"]).dt.date
+        user_stats = user_stats[["username", "sessions", "questions", "last_activity"]]
         st.dataframe(user_stats)
         csv = user_stats.to_csv(index=False).encode("utf-8")
         st.download_button("Download CSV", csv, "user_stats.csv", "text/csv")
     else:
         st.info("No user statistics available.")
 
-    # 6) Filter by user/date/keyword
+    # 6) Filter by user/date/keyword (user and date range are applied by the backend)
     st.subheader("Filter Sessions")
-    ufilter = st.selectbox("User", ["All"] + [u["username"] for u in users])
-    if not df.empty:
-         # Convert 'timestamp' column to datetime if not already
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        df["date"] = df["timestamp"].dt.date
-
-        # Get date range from user input
-        date_range = st.date_input("Date range", [df["date"].min(), df["date"].max()])
-        key = st.text_input("Keyword in messages")
-
-        # Convert date_range to Pandas Timestamps
-        start_date = pd.to_datetime(date_range[0])
-        end_date = pd.to_datetime(date_range[1])
-
-        filt = df.copy()
-        if ufilter != "All":
-            filt = filt[filt["username"] == ufilter]
-        filt = filt[(filt["timestamp"] >= start_date) & (filt["timestamp"] <= end_date)]
-        if key:
-            filt = filt[filt.apply(lambda r: key.lower() in json.dumps(r, default=str).lower(), axis=1)]
-        st.write(f"Showing {len(filt)} sessions")
-        st.dataframe(filt)
+    usernames = {u["username"]: u["user_id"] for u in users}
+    ufilter = st.selectbox("User", ["All"] + list(usernames))
+    if not days.empty:
+        date_range = st.date_input("Date range", [days["date"].min(), days["date"].max()])
+        key = st.text_input("Keyword in sessions")
+
+        if len(date_range) == 2:
+            params = {"start": date_range[0].isoformat(), "end": date_range[1].isoformat()}
+            if ufilter != "All":
+                params["user_id"] = usernames[ufilter]
+            filtered = fetch_stats(params)
+            if filtered is None:
+                st.error("Failed to filter sessions.")
+            else:
+                filt = pd.DataFrame(filtered["sessions"])
+                if key and not filt.empty:
+                    filt = filt[filt.apply(lambda r: key.lower() in json.dumps(r.to_dict(), default=str).lower(), axis=1)]
+                st.write(f"Showing {len(filt)} of {filtered['total_sessions']} sessions")
+                st.dataframe(filt)
     else:
         st.info("No sessions available for filtering.")
 
-    # 7) Raw JSON download
+    # 7) Raw logs download: streamed from the backend by this server, on request
     st.subheader("Download Raw Logs")
-    raw_res = requests.get(f"{BACKEND_URL}/admin/raw_logs")
-    if raw_res.status_code == 200:
-        raw = raw_res.text
-        st.download_button("Download JSON", raw, "logs.json", "application/json")
-    else:
-        st.error("Failed to fetch raw logs.")
+    log_params = {}
+    if ufilter != "All":
+        log_params["user_id"] = usernames[ufilter]
+    if not days.empty and len(date_range) == 2:
+        log_params.update(start=date_range[0].isoformat(), end=date_range[1].isoformat())
+    st.caption("Uses the user and date range selected above. One JSON message per line.")
+    compress = st.checkbox("gzip", value=True)
+    if st.button("Prepare raw logs"):
+        export_path = fetch_raw_logs(log_params, compress)
+        if export_path is None:
+            st.error("Failed to export raw logs.")
+        else:
+            filename = "logs.ndjson.gz" if compress else "logs.ndjson"
+            try:
+                with open(export_path, "rb") as export:
+                    st.download_button("Download " + filename, export, filename,
+                                       "application/gzip" if compress else "application/x-ndjson")
+            finally:
+                os.remove(export_path)
 
     st.success("✅ Admin analytics loaded.")
     
     # 8) View individual chat sessions with Q&A expanders
     st.subheader("🔍 View Chat Session Details")
 
-    if not df.empty:
+    if usernames:
         # 1) Select user
-        selected_user = st.selectbox(
-            "Select User", 
-            df["username"].unique()
-        )  # st.selectbox for choosing items :contentReference[oaicite:2]{index=2}
+        selected_user = st.selectbox("Select User", list(usernames))
+        user_id = usernames[selected_user]
 
-        # 2) Filter sessions for that user
-        user_sessions = df[df["username"] == selected_user]
+        # 2) List that user's sessions
+        chats_res = requests.get(f"{BACKEND_URL}/user/chats/{user_id}")
+        user_sessions = chats_res.json().get("chats", []) if chats_res.status_code == 200 else []
 
-        if not user_sessions.empty:
+        if user_sessions:
             # 3) Select one of their sessions
             selected_session = st.selectbox(
-                "Select Session", 
-                user_sessions["chat_name"].tolist()
+                "Select Session",
+                range(len(user_sessions)),
+                format_func=lambda i: user_sessions[i]["chat_name"]
             )
-
-            # 4) Look up chat_id & user_id
-            row = user_sessions[user_sessions["chat_name"] == selected_session].iloc[0]
-            chat_id = row["chat_id"]
-            user_id = row["user_id"]
-
-            # 5) Fetch full history once
-            hist_res = requests.get(f"{BACKEND_URL}/hist/{user_id}")  # HTTP fetch :contentReference[oaicite:3]{index=3}
-            if hist_res.status_code == 200:
-                history = hist_res.json()  # parse JSON :contentReference[oaicite:4]{index=4}
-
-                # 6) Find the matching chat_history entry
-                for doc in history:
-                    for chat in doc.get("chat_history", []):
-                        if chat["chat_id"] == chat_id:
-                            st.markdown(f"### Chat: {chat['chat_name']}")
-                            
-                            # 7) Show each turn’s Q & A in an expander
-                            for i, msg in enumerate(chat.get("messages", []), start=1):  # enumerate turns :contentReference[oaicite:5]{index=5}
-                                ts = msg.get("timestamp", "")
-                                with st.expander(f"Turn {i} — {ts}"):              # st.expander usage :contentReference[oaicite:6]{index=6}
-                                    st.markdown(f"**Question:** {msg.get('question','')}")  
-                                    st.markdown(f"**Answer:** {msg.get('answer','')}")
-
+            chat_id = user_sessions[selected_session]["chat_id"]
+
+            # 4) Fetch the latest page of that chat
+            chat_res = requests.get(f"{BACKEND_URL}/user/chat/{user_id}/{chat_id}", params={"limit": SESSION_PAGE_SIZE})
+            if chat_res.status_code == 200:
+                chat = chat_res.json()
+                st.markdown(f"### Chat: {chat['chat_name']}")
+                if chat.get("has_more"):
+                    st.caption(f"Showing the latest {len(chat['messages'])} turns.")
+
+                # 5) Show each turn’s Q & A in an expander
+                for i, msg in enumerate(chat.get("messages", []), start=1):
+                    ts = msg.get("timestamp", "")
+                    with st.expander(f"Turn {i} — {ts}"):
+                        st.markdown(f"**Question:** {msg.get('question','')}")
+                        st.markdown(f"**Answer:** {msg.get('answer','')}")
             else:
                 st.error("Failed to fetch chat history.")
         else:
@@ -1,10 +1,12 @@
 import streamlit as st
 import requests
+import json
 from uuid import uuid4
 from libs.auth import clear_login_token
 from datetime import datetime
 
 BACKEND_URL = "http://127.0.0.1:5000/"
+PAGE_SIZE = 30  # messages fetched per page of chat history
 
 def get_top_unique_links(links, limit=5):
     """
@@ -20,6 +22,28 @@ def get_top_unique_links(links, limit=5):
             break
     return unique_links
 
+# -------------------- Load Chat Messages --------------------
+def load_chat_messages(user_id, chat_id, before=None):
+    """
+    Fetches the latest page of a chat (or the page before the `before` cursor) into
+    st.session_state.chat_sessions. Returns the response status code.
+    """
+    params = {"limit": PAGE_SIZE}
+    if before:
+        params["before"] = before
+    res = requests.get(f"{BACKEND_URL}/user/chat/{user_id}/{chat_id}", params=params)
+    if res.status_code == 200:
+        data = res.json()
+        session = st.session_state.chat_sessions[chat_id]
+        if before:
+            session["messages"] = data.get("messages", []) + session["messages"]
+        else:
+            session["messages"] = data.get("messages", [])
+        session["has_more"] = data.get("has_more", False)
+        session["before_cursor"] = data.get("before_cursor")
+        session["loaded"] = True
+    return res.status_code
+
 # -------------------- Get Response from Backend --------------------
 def get_bot_response(user_input):
     user_id = st.session_state.get("user_id")
@@ -44,6 +68,39 @@ def get_bot_response(user_input):
         st.error(f"❌ Backend not reachable: {e}")
         return "❌ Backend not reachable."
 
+def stream_bot_response(user_input, result):
+    """
+    Yields answer text chunks from /ask/stream as they arrive (for st.write_stream).
+    The final answer dict ({"answer", "contributing_links"}) is left in result["answer"].
+    """
+    payload = {
+        "user_id": st.session_state.get("user_id"),
+        "chat_id": st.session_state.current_chat_id,
+        "question": user_input,
+        "mode": st.session_state.get("mode", "Web Search")
+    }
+    result["answer"] = {"answer": "❌ Failed to get response from backend.", "contributing_links": []}
+
+    try:
+        with requests.post(f"{BACKEND_URL}/ask/stream", json=payload, stream=True) as res:
+            if res.status_code != 200:
+                st.error(f"❌ Failed to get response from backend. Status code: {res.status_code}")
+                return
+            for line in res.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                if event["type"] == "chunk":
+                    yield event["text"]
+                elif event["type"] == "done":
+                    result["answer"] = event["answer"]
+                elif event["type"] == "error":
+                    result["answer"] = {"answer": event["message"], "contributing_links": []}
+                    yield event["message"]
+    except requests.exceptions.RequestException as e:
+        st.error(f"❌ Backend not reachable: {e}")
+        result["answer"] = {"answer": "❌ Backend not reachable.", "contributing_links": []}
+
 # -------------------- Image to Query --------------------
 
 def get_query_from_image(image_file):
@@ -122,10 +179,7 @@ def chat():
         if st.session_state.chat_sessions:
             st.session_state.current_chat_id = list(st.session_state.chat_sessions.keys())[0]
             try:
-                res = requests.get(f"{BACKEND_URL}/user/chat/{user_id}/{st.session_state.current_chat_id}")
-                if res.status_code == 200:
-                    st.session_state.chat_sessions[st.session_state.current_chat_id]["messages"] = res.json().get("messages", [])
-                else:
+                if load_chat_messages(user_id, st.session_state.current_chat_id) != 200:
                     st.warning("Could not load messages for the required chat.")
             except requests.exceptions.RequestException:
                 st.warning("Server unreachable while loading welcome chat messages.")
@@ -136,10 +190,7 @@ def chat():
             st.session_state.current_chat_id = new_id
             # Immediately fetch messages for the default chat
             try:
-                res = requests.get(f"{BACKEND_URL}/user/chat/{user_id}/{new_id}")
-                if res.status_code == 200:
-                    st.session_state.chat_sessions[new_id]["messages"] = res.json().get("messages", [])
-                else:
+                if load_chat_messages(user_id, new_id) != 200:
                     st.warning("Could not load messages for the welcome chat.")
             except requests.exceptions.RequestException:
                 st.warning("Server unreachable while loading welcome chat messages.")
@@ -170,15 +221,13 @@ def chat():
 
         if selected_chat_id != st.session_state.current_chat_id:
             st.session_state.current_chat_id = selected_chat_id
-            # Fetch messages for the selected chat
-            try:
-                res = requests.get(f"{BACKEND_URL}/user/chat/{user_id}/{selected_chat_id}")
-                if res.status_code == 200:
-                    st.session_state.chat_sessions[selected_chat_id]["messages"] = res.json().get("messages", [])
-                else:
-                    st.warning(f"Could not load messages for chat ID: {selected_chat_id}")
-            except requests.exceptions.RequestException:
-                st.warning("Server unreachable while loading chat messages.")
+            # Fetch the latest page for the selected chat (once; later switches reuse it)
+            if not st.session_state.chat_sessions[selected_chat_id].get("loaded"):
+                try:
+                    if load_chat_messages(user_id, selected_chat_id) != 200:
+                        st.warning(f"Could not load messages for chat ID: {selected_chat_id}")
+                except requests.exceptions.RequestException:
+                    st.warning("Server unreachable while loading chat messages.")
             st.rerun()
 
         # Rethink button in sidebar to toggle mode
@@ -289,6 +338,13 @@ def chat():
     chat_info = st.session_state.chat_sessions[current_chat_id]
     chat_history = chat_info.get("messages", [])
 
+    if chat_info.get("has_more") and st.button("⬆️ Load earlier messages"):
+        try:
+            load_chat_messages(user_id, current_chat_id, before=chat_info.get("before_cursor"))
+        except requests.exceptions.RequestException:
+            st.warning("Server unreachable while loading earlier messages.")
+        st.rerun()
+
     for msg in chat_history:
         if "question" in msg and "answer" in msg:
             # User message
@@ -324,14 +380,13 @@ def chat():
         with st.chat_message("user"):
             st.markdown(f"**You:** {user_input}")
 
-        # Get and display bot response
-        response = get_bot_response(user_input)
-        st.session_state.chat_sessions[current_chat_id]["messages"][-1]["answer"] = response
-
         with st.chat_message("assistant"):
-            # Display answer
+            # Stream the answer as it is generated
             st.markdown("**Answer:**")
-            st.info(response["answer"])  # Boxed answer
+            result = {}
+            st.write_stream(stream_bot_response(user_input, result))
+            response = result["answer"]
+            st.session_state.chat_sessions[current_chat_id]["messages"][-1]["answer"] = response
 
             # Display contributing links
             if response["contributing_links"]: